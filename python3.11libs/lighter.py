@@ -1,14 +1,19 @@
 from PySide2.QtWidgets import (QWidget, QGraphicsScene, QGraphicsView, QGraphicsItem, QPushButton,
-                               QGraphicsPolygonItem, QGraphicsPixmapItem, QSizePolicy, QVBoxLayout, QHBoxLayout, 
-                               QAction, QCheckBox, QTabWidget, QMenu, QScrollArea)
-from PySide2.QtGui import (QPixmap, QPen, QBrush, QPolygonF, QPainter, QImage, QColor,
+                               QGraphicsPolygonItem, QGraphicsPixmapItem, QGraphicsPathItem, QGraphicsRectItem,
+                               QSizePolicy, QVBoxLayout, QHBoxLayout, 
+                               QAction, QCheckBox, QTabWidget, QMenu, QScrollArea, QLabel, QStackedWidget,
+                               QTableView, QAbstractItemView, QStyledItemDelegate, QComboBox, QLineEdit)
+from PySide2.QtGui import (QPixmap, QPen, QBrush, QPolygonF, QPainter, QPainterPath, QImage, QColor,
                            QIntValidator, QDoubleValidator, QKeySequence)
-from PySide2.QtCore import Qt, QSize, QPointF, Slot
+from PySide2.QtCore import (Qt, QSize, QPointF, Slot, Signal, QObject, QRunnable, QThreadPool, QTimer,
+                            QAbstractTableModel, QModelIndex, QSortFilterProxyModel)
 
-import hou, numpy, os, math
+import hou, numpy, os, math, shiboken2
+import lighter_detect
 from math import pi, sin, cos, degrees, radians, sqrt, asin, acos, atan2
 from husdui import widgets
 from functools import partial
+from collections import OrderedDict
 from pprint import pprint as pp
 
 """
@@ -300,7 +305,8 @@ class Button(QWidget) :
         self.parm = parm
 
     def pressButton(self) :
-        self.parm.pressButton()
+        if self.parm is not None :
+            self.parm.pressButton()
 
     def setColor(self, color) :
         self.button.setStyleSheet(f"QPushButton {{ color: rgb({color[0]},{color[1]},{color[2]}); }}")
@@ -316,6 +322,7 @@ class SliderParm(QWidget) :
     def __init__(self, valType=hou.qt.InputField.FloatType, name="Label", range=(0,10), parent=None) :
         super().__init__(parent)
         self.parm = None
+        self.commit = None
         self._field = self._createField(valType, name)
         self._slider = self._createSlider(valType, range)
 
@@ -334,7 +341,14 @@ class SliderParm(QWidget) :
         self.parm = parm
         self.setValue(self.parm.eval())
 
+    # commit, when set, writes the value instead of the widget once the slider is released
     def updateParm(self) :
+        if self.parm is None :
+            return
+        if self.commit is not None :
+            if not self._slider.isSliderDown() :
+                self.commit(self.parm, self.getValue())
+            return
         current_val = self.parm.eval()
         self.parm.set(self.getValue())
         new_val = self.parm.eval()
@@ -382,6 +396,8 @@ class SliderParm(QWidget) :
             self.reset()
 
     def reset(self):
+        if self.parm is None :
+            return
         self.parm.revertToDefaults()
         self.parm.pressButton()
         self.setValue(self.parm.eval())
@@ -443,6 +459,7 @@ class ComboBoxField(QWidget):
     def __init__(self, name="Label", parent=None):
         super().__init__(parent)
         self.parm = None
+        self.commit = None
         self.label = hou.qt.FieldLabel(name)
         self.field = hou.qt.ComboBox()
 
@@ -454,12 +471,18 @@ class ComboBoxField(QWidget):
         self.setSizePolicy(QSizePolicy.Preferred, QSizePolicy.Preferred)
         self.setLayout(lay)
 
+        self.field.currentIndexChanged.connect(self.updateParm)
+
     def setParm(self, parm):
         self.parm = parm
         self.setValue(self.parm.rawValue())
-        self.field.currentIndexChanged.connect(self.updateParm)
 
     def updateParm(self):
+        if self.parm is None :
+            return
+        if self.commit is not None :
+            self.commit(self.parm, self.getValue())
+            return
         current_val = self.parm.eval()
         new_val = self.getValue()
         self.parm.set(new_val)
@@ -587,22 +610,80 @@ class LightShapeItem(QGraphicsPolygonItem):
 Resizable graphics view for HDR map
 """
 class ResizableGraphicsView(QGraphicsView):
+    viewChanged = Signal()
+
     def __init__(self, lightsView, parent=None):
         super().__init__(parent)
         self.setRenderHint(QPainter.Antialiasing)
         self.lightsView = lightsView
+        self.zoomed = False
+        self.panStart = None
+        self.setTransformationAnchor(QGraphicsView.AnchorUnderMouse)
+        self.setHorizontalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
+        self.setVerticalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
+        self.horizontalScrollBar().valueChanged.connect(lambda value : self.viewChanged.emit())
+        self.verticalScrollBar().valueChanged.connect(lambda value : self.viewChanged.emit())
 
     def resizeEvent(self, event):
         super().resizeEvent(event)
+        if not self.zoomed :
+            self.fitInView(self.sceneRect(), Qt.KeepAspectRatio)
+        self.viewChanged.emit()
+
+    def fitMap(self) :
+        self.zoomed = False
         self.fitInView(self.sceneRect(), Qt.KeepAspectRatio)
+        self.viewChanged.emit()
+
+    # wheel zooms under the cursor, zoom out stops at the whole map
+    def wheelEvent(self, event):
+        factor = 1.25 if event.angleDelta().y() > 0 else 0.8
+        self.scale(factor, factor)
+        self.zoomed = True
+        rect = self.sceneRect()
+        fit = min(self.viewport().width() / max(rect.width(), 1.0), self.viewport().height() / max(rect.height(), 1.0))
+        if self.transform().m11() <= fit :
+            self.fitMap()
+        else :
+            self.viewChanged.emit()
+        event.accept()
 
     def setEnvTab(self) :
         self.lightsView.setCurrentIndex(0)
 
+    # middle button pans zoomed map
     def mousePressEvent(self, event):
+        if event.button() == Qt.MiddleButton and self.zoomed :
+            self.panStart = event.pos()
+            event.accept()
+            return
         super().mousePressEvent(event)
         event.accept()
 
+    def mouseMoveEvent(self, event):
+        if self.panStart is not None :
+            delta = event.pos() - self.panStart
+            self.panStart = event.pos()
+            self.horizontalScrollBar().setValue(self.horizontalScrollBar().value() - delta.x())
+            self.verticalScrollBar().setValue(self.verticalScrollBar().value() - delta.y())
+            event.accept()
+            return
+        super().mouseMoveEvent(event)
+
+    def mouseReleaseEvent(self, event):
+        if self.panStart is not None and event.button() == Qt.MiddleButton :
+            self.panStart = None
+            event.accept()
+            return
+        super().mouseReleaseEvent(event)
+
+    def mouseDoubleClickEvent(self, event):
+        if event.button() == Qt.MiddleButton :
+            self.fitMap()
+            event.accept()
+            return
+        super().mouseDoubleClickEvent(event)
+
 """
 Clicable pixmap item for HDR map
 """
@@ -678,10 +759,210 @@ class ClickablePixmapItem(QGraphicsPixmapItem):
         self.node.parm("rotz").set(0)
         self.upadate()
 
+"""
+Job of detection worker, skipped if newer job was submitted before it started
+"""
+class DetectionJob(QRunnable) :
+    def __init__(self, worker, job, func) :
+        super().__init__()
+        self.worker = worker
+        self.job = job
+        self.func = func
+
+    def run(self) :
+        if self.job != self.worker.job :
+            return
+        result = self.func()
+        if self.job == self.worker.job :
+            self.worker.done.emit(self.job, result)
+
+"""
+Runs headless detection in a thread pool, numpy releases GIL so the panel stays responsive.
+Only the last submitted job is delivered: queued older jobs are removed from the pool,
+running ones finish but their results are dropped. Result comes to handler in the main thread.
+Pool runs one job at a time, detector stages cache is not shared between threads.
+"""
+class DetectionWorker(QObject) :
+    done = Signal(int, object)
+
+    def __init__(self, parent=None) :
+        super().__init__(parent)
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(1)
+        self.job = 0
+        self.handler = None
+        self.done.connect(self.deliver)
+
+    def submit(self, handler, func) :
+        self.cancel()
+        self.handler = handler
+        self.pool.start(DetectionJob(self, self.job, func))
+
+    def cancel(self) :
+        self.job += 1
+        self.handler = None
+        self.pool.clear()
+
+    @Slot(int, object)
+    def deliver(self, job, result) :
+        if job == self.job and self.handler is not None :
+            handler = self.handler
+            self.handler = None
+            handler(result)
+
+"""
+Tone mapping of float preview pixels with lookup tables
+Pixels are converted to table indices (fractions of stops) once per map,
+exposure only shifts indices, so changing it costs one lookup per channel.
+Tables are cached for every gamma and curve. Output buffer is reused.
+"""
+class ToneMapper :
+    STEPS = 256
+    LOWEST = -20.0
+    HIGHEST = 20.0
+
+    def __init__(self) :
+        self.tables = {}
+        self.index = None
+        self.shifted = None
+        self.output = None
+
+    def indices(self, image) :
+        stops = numpy.log2(numpy.maximum(image, 2.0 ** self.LOWEST))
+        stops = numpy.minimum(stops, self.HIGHEST)
+        return ((stops - self.LOWEST) * self.STEPS).astype(numpy.int16)
+
+    def setImage(self, image) :
+        self.index = self.indices(image)
+        self.shifted = numpy.empty_like(self.index)
+        self.output = numpy.empty(image.shape, dtype=numpy.uint8)
+
+    # 8 bit values for every table index, darkest index is black
+    def table(self, gamma, curve) :
+        key = (gamma, curve)
+        if key not in self.tables :
+            size = int((self.HIGHEST - self.LOWEST) * self.STEPS) + 1
+            x = 2.0 ** (self.LOWEST + numpy.arange(size) / float(self.STEPS))
+            if curve == "reinhard" :
+                x = x / (1.0 + x)
+            elif curve == "filmic" :
+                x = (x * (2.51 * x + 0.03)) / (x * (2.43 * x + 0.59) + 0.14)
+            x = numpy.clip(x, 0.0, 1.0) ** (1.0 / max(gamma, 0.01))
+            table = numpy.round(x * 255.0).astype(numpy.uint8)
+            table[0] = 0
+            self.tables[key] = table
+        return self.tables[key]
+
+    def apply(self, exposure, gamma, curve) :
+        table = self.table(gamma, curve)
+        numpy.add(self.index, int(round(exposure * self.STEPS)), out=self.shifted)
+        numpy.clip(self.shifted, 0, len(table) - 1, out=self.shifted)
+        numpy.take(table, self.shifted, out=self.output)
+        return self.output
+
+    # tone mapped copy of any image, nothing is kept
+    def map(self, image, exposure, gamma, curve) :
+        table = self.table(gamma, curve)
+        index = self.indices(image) + int(round(exposure * self.STEPS))
+        return table[numpy.clip(index, 0, len(table) - 1)]
+
+"""
+Tiles of the map streamed into the scene when viewer is zoomed closer than the preview pixmap
+Pyramid of the float map is built once per map (levels halve the size down to the preview),
+only tiles of the visible area on the level matching zoom are made and shown.
+Made tiles are kept in a cache with limited size, least recently used are dropped.
+Tiles are tone mapped by viewer settings, OCIO View is approximated by linear curve.
+"""
+class MapTiles :
+    TILE = 256
+    CACHE = 192
+
+    def __init__(self, scene) :
+        self.scene = scene
+        self.key = None
+        self.levels = []
+        self.cache = OrderedDict()
+        self.items = []
+        self.toneMapper = ToneMapper()
+
+    # levels from full resolution down to the first one not bigger than base width,
+    # derived levels are stored in half floats
+    def setImage(self, key, image, baseWidth) :
+        if key == self.key :
+            return
+        self.key = key
+        self.cache.clear()
+        self.levels = [image]
+        while self.levels[-1].shape[1] // 2 > baseWidth and self.levels[-1].shape[0] > 1 :
+            height, width = self.levels[-1].shape[:2]
+            self.levels.append(lighter_detect.resample(self.levels[-1], width // 2, height // 2).astype(numpy.float16))
+
+    def tile(self, level, tx, ty, tone) :
+        key = (level, tx, ty, tone)
+        if key in self.cache :
+            self.cache.move_to_end(key)
+            return self.cache[key][0]
+        image = self.levels[level]
+        pixels = numpy.ascontiguousarray(self.toneMapper.map(image[ty * self.TILE:(ty + 1) * self.TILE,
+                                                                   tx * self.TILE:(tx + 1) * self.TILE], *tone))
+        height, width = pixels.shape[:2]
+        qimage = QImage(pixels.data, width, height, width * 3, QImage.Format_RGB888)
+        # pixmap can share image memory, pixels stay with it in the cache
+        self.cache[key] = (QPixmap.fromImage(qimage), qimage, pixels)
+        while len(self.cache) > self.CACHE :
+            self.cache.popitem(last=False)
+        return self.cache[key][0]
+
+    # show tiles covering rect (scene coordinates are pixels of base width) for zoom (screen pixels per scene unit)
+    def update(self, rect, zoom, baseWidth, tone) :
+        if not self.levels :
+            return
+        level = 0
+        for i, image in enumerate(self.levels) :
+            if image.shape[1] >= zoom * baseWidth :
+                level = i
+        image = self.levels[level]
+        height, width = image.shape[:2]
+        if width <= baseWidth :
+            self.hide()
+            return
+        scale = baseWidth / float(width)
+        left = max(int(rect.left() / scale) // self.TILE, 0)
+        right = min(int(rect.right() / scale) // self.TILE, (width - 1) // self.TILE)
+        top = max(int(rect.top() / scale) // self.TILE, 0)
+        bottom = min(int(rect.bottom() / scale) // self.TILE, (height - 1) // self.TILE)
+        tiles = [(tx, ty) for ty in range(top, bottom + 1) for tx in range(left, right + 1)]
+        if len(tiles) > self.CACHE :
+            self.hide()
+            return
+
+        while len(self.items) < len(tiles) :
+            item = QGraphicsPixmapItem()
+            item.setAcceptedMouseButtons(Qt.NoButton)
+            item.setZValue(0.5)
+            item.setTransformationMode(Qt.SmoothTransformation)
+            self.scene.addItem(item)
+            self.items.append(item)
+        for item, (tx, ty) in zip(self.items, tiles) :
+            item.setPixmap(self.tile(level, tx, ty, tone))
+            item.setScale(scale)
+            item.setPos(tx * self.TILE * scale, ty * self.TILE * scale)
+            item.setVisible(True)
+        for item in self.items[len(tiles):] :
+            item.setVisible(False)
+
+    def hide(self) :
+        for item in self.items :
+            item.setVisible(False)
+
 """
 Graphics view for lights shapes and Hdr map preview
 """
 class HdrView(QWidget) :
+    # parms of every light, kept when lights change order
+    LIGHT_PARMS = ("separate#", "renderable#", "fill#", "clr#r", "clr#g", "clr#b", "exposure#",
+                   "name#", "lpe#", "lighttype#", "dist_angle#", "dist#", "use_tex#")
+
     def __init__(self, lightsView, parent=None) :
         super().__init__(parent)
         self.asset = None
@@ -689,13 +970,35 @@ class HdrView(QWidget) :
         self.parms = None
         self.lightsView = lightsView
         self.pixmap_item = None
+        self.preview_item = None
+        self.preview_clip = None
         self.background = None
+        self.previewBytes = None
+        self.previewImage = None
+        self.toneMapper = ToneMapper()
+        self.toneKey = None
+        self.tone = (0.0, 2.2, "view")
+        self.tiles = None
+        self.source = None
+        self.detectCache = lighter_detect.Detector()
+        self.pixelsKey = None
+        self.worker = DetectionWorker(self)
+        self.diskCache = lighter_detect.DiskCache(os.path.join(hou.text.expandString("$HOUDINI_USER_PREF_DIR"), "lighter_cache"))
+        self.cached = None
+        self.cachedKey = None
         self.shapes = []
+        self.polygons = []
+        self.shapesKey = None
 
     def initView(self) :
         self.scene = QGraphicsScene()
         self.view = ResizableGraphicsView(self.lightsView)
         self.view.setScene(self.scene)
+        self.tiles = MapTiles(self.scene)
+        self.tilesTimer = QTimer(self)
+        self.tilesTimer.setSingleShot(True)
+        self.tilesTimer.timeout.connect(self.updateTiles)
+        self.view.viewChanged.connect(lambda : self.tilesTimer.start(0))
 
         self.view.setRenderHint(QPainter.Antialiasing)
         self.view.setViewportUpdateMode(QGraphicsView.FullViewportUpdate)
@@ -721,52 +1024,224 @@ class HdrView(QWidget) :
     def setWidthForHeight(self, height):
         return height * 2
 
+    # preview pixels are fetched once as bytes and wrapped by QImage without copying.
+    # Pixmap can share image memory, so bytes and image are kept until the next fetch.
+    # With tone curve other than OCIO view, float map is tone mapped instead of cooking the VIEW
     def setHDR(self, copNode) :
         self.cop = copNode
         width = self.cop.xRes()
         height = self.cop.yRes()
-        imgArr = numpy.frombuffer(self.cop.allPixelsAsString("C", depth=hou.imageDepth.Int8), dtype=numpy.int8)
-        img = QImage(imgArr.data, width, height, QImage.Format_RGB888)
-        self.background = QPixmap(img)
+        exposure, gamma, curve = self.tone
+        if curve == "view" :
+            self.previewBytes = self.cop.allPixelsAsString("C", depth=hou.imageDepth.Int8)
+        else :
+            detector = self.detector()
+            key = (self.pixelsKey, width, height)
+            if key != self.toneKey :
+                self.toneMapper.setImage(lighter_detect.resample(detector.image, width, height))
+                self.toneKey = key
+            self.previewBytes = self.toneMapper.apply(exposure, gamma, curve)
+        self.previewImage = QImage(self.previewBytes, width, height, width * 3, QImage.Format_RGB888)
+        self.background = QPixmap.fromImage(self.previewImage)
         if self.pixmap_item is None :
-            pixmap_item = ClickablePixmapItem(self.background)
-            pixmap_item.setLightsView(self.lightsView)
-            pixmap_item.setNode(self.asset)
-            pixmap_item.setZValue(0)
-            self.scene.addItem(pixmap_item)
+            self.pixmap_item = ClickablePixmapItem(self.background)
+            self.pixmap_item.setLightsView(self.lightsView)
+            self.pixmap_item.setNode(self.asset)
+            self.pixmap_item.setZValue(0)
+            self.scene.addItem(self.pixmap_item)
         else :
             self.pixmap_item.setPixmap(self.background)
+            self.pixmap_item.setNode(self.asset)
+        self.updateTiles()
+
+    # viewer exposure, gamma and tone curve ("view" shows VIEW network as is)
+    def setTone(self, exposure, gamma, curve) :
+        self.tone = (exposure, gamma, curve)
+        if self.cop is not None :
+            self.setHDR(self.cop)
+
+    # full resolution tiles over the preview pixmap when view is zoomed in
+    def updateTiles(self) :
+        if self.background is None or self.asset is None :
+            return
+        zoom = self.view.transform().m11()
+        if not self.view.zoomed or zoom <= 1.0 :
+            self.tiles.hide()
+            return
+        detector = self.detector()
+        baseWidth = self.background.width()
+        self.tiles.setImage(self.pixelsKey, detector.image, baseWidth)
+        exposure, gamma, curve = self.tone
+        tone = (0.0, 2.2, "linear") if curve == "view" else self.tone
+        rect = self.view.mapToScene(self.view.viewport().rect()).boundingRect()
+        self.tiles.update(rect, zoom, baseWidth, tone)
 
     def setAsset(self, node) :
         self.asset = node
         self.cop = self.asset.node("VIEW/OUT")
+        self.source = self.asset.node("comp/switch3")
+        self.pixelsKey = None
         self.setHDR(self.cop)
 
+    # float pixels of cop node, rows from top to bottom
+    def fetchPixels(self, cop) :
+        if hasattr(cop, "layer") :
+            # copernicus node
+            layer = cop.layer()
+            width, height = layer.bufferResolution()
+            channels = layer.channelCount()
+            data = numpy.frombuffer(layer.allBufferElements(), dtype=numpy.float32)
+        else :
+            width, height = cop.xRes(), cop.yRes()
+            channels = 3
+            data = numpy.frombuffer(cop.allPixelsAsString("C", depth=hou.imageDepth.Float32), dtype=numpy.float32)
+        # houdini buffers start from the bottom row
+        return numpy.flipud(data.reshape(height, width, channels))
+
+    # headless detector of rotated input map. Pixels are fetched only when map or rotation changed,
+    # detection stages are cached by the detector
+    def detector(self) :
+        key = (self.asset.parm("texpath").eval(), self.asset.parm("envres").eval(), self.asset.parmTuple("rot").eval())
+        if key != self.pixelsKey :
+            # new detector, worker can still be running on the old one.
+            # Asset doesn't join highlights across map sides, preview shouldn't either
+            self.detectCache = lighter_detect.Detector(self.fetchPixels(self.source), wrap=False)
+            self.pixelsKey = key
+        return self.detectCache
+
+    # QPolygonF from (n, 2) array, points are copied into its buffer at once.
+    # Point by point only if binding doesn't give the buffer
+    def toPolygon(self, points) :
+        points = numpy.ascontiguousarray(points, dtype=numpy.float64).reshape(-1, 2)
+        try :
+            polygon = QPolygonF()
+            polygon.resize(len(points))
+            if len(points) :
+                buffer = shiboken2.VoidPtr(polygon.data(), points.nbytes, True)
+                numpy.frombuffer(buffer, dtype=numpy.float64).reshape(-1, 2)[:] = points
+            return polygon
+        except (AttributeError, TypeError, ValueError) :
+            return QPolygonF([QPointF(x, y) for x, y in points.tolist()])
+
+    # polygons in scene coordinates from lighter_detect.Contours made in detect map of given width
+    def toPolygons(self, contours, width, mapWidth) :
+        scale = mapWidth / float(width)
+        return [self.toPolygon(contours.polygon(i) * scale) for i in range(len(contours))]
+
+    # outlines of contours as one path
+    # doesn't touch scene items, so it can be built in detection worker
+    def previewPath(self, contours, width, mapWidth) :
+        path = QPainterPath()
+        for polygon in self.toPolygons(contours, width, mapWidth) :
+            path.addPolygon(polygon)
+            path.closeSubpath()
+        return path
+
+    # draw highlights outlines over the map without cooking the asset. None removes preview
+    # and drops preview jobs still running in the worker
+    def setPreview(self, contours, width=None) :
+        if contours is None :
+            self.worker.cancel()
+            if self.preview_clip is not None :
+                self.preview_clip.setVisible(False)
+            return
+        self.setPreviewPath(self.previewPath(contours, width, self.background.width()))
+
+    # show outlines path clipped by the map
+    def setPreviewPath(self, path) :
+        if self.preview_clip is None :
+            self.preview_clip = QGraphicsRectItem()
+            self.preview_clip.setPen(Qt.NoPen)
+            self.preview_clip.setFlag(QGraphicsItem.ItemClipsChildrenToShape, True)
+            self.preview_clip.setAcceptedMouseButtons(Qt.NoButton)
+            self.preview_clip.setZValue(2)
+            self.preview_item = QGraphicsPathItem(self.preview_clip)
+            self.preview_item.setPen(QPen(QColor.fromRgb(*Colors.shapeDef), 2, Qt.DashLine))
+            self.preview_item.setAcceptedMouseButtons(Qt.NoButton)
+            self.scene.addItem(self.preview_clip)
+        self.preview_clip.setRect(self.background.rect())
+        self.preview_item.setPath(path)
+        self.preview_clip.setVisible(True)
+
+    # detect outlines in the worker and show them when ready, newer request drops older one.
+    # Pixels are fetched here, hou is used only in the main thread
+    def previewAsync(self, clip, blursize, size, threshold, detectres) :
+        detector = self.detector()
+        mapWidth = self.background.width()
+        def run() :
+            contours = detector.contours(clip, blursize, size, threshold, detectres)
+            return self.previewPath(contours, detectres, mapWidth)
+        self.worker.submit(self.setPreviewPath, run)
+
     def setLightsView(self, lightsView) :
         self.lightsView = lightsView
 
-    # build shapes from geo
+    # key of detection results in disk cache, None if map file doesn't exist
+    def cacheKey(self) :
+        path = hou.text.expandString(self.asset.parm("texpath").eval())
+        if not os.path.isfile(path) :
+            return None
+        parms = [self.asset.type().name()]
+        parms += [self.asset.parm(name).eval() for name in ("detectres", "clip", "blursize", "size", "threshold", "envres")]
+        parms += list(self.asset.parmTuple("rot").eval())
+        return self.diskCache.key(path, *parms)
+
+    # names, polygons, labels and stats saved for current map and parameters or None
+    def cachedResults(self) :
+        key = self.cacheKey()
+        if key is None :
+            return None
+        if key != self.cachedKey :
+            self.cached = self.diskCache.load(key)
+            self.cachedKey = key
+        return self.cached
+
+    # names and (n, 2) point arrays of POLYGONS prims. Positions and names are read with one call each.
+    # Traced prims own consecutive points, then points are split by vertex counts,
+    # otherwise point numbers are read prim by prim
+    def fetchPolygons(self) :
+        geo = self.asset.node("geo/POLYGONS").geometry()
+        names = list(geo.primStringAttribValues("name"))
+        positions = numpy.frombuffer(geo.pointFloatAttribValuesAsString("P"), dtype=numpy.float32).reshape(-1, 3)[:, :2]
+        prims = geo.prims()
+        if not prims :
+            return names, []
+        counts = [prim.numVertices() for prim in prims]
+        offsets = numpy.concatenate(([0], numpy.cumsum(counts, dtype=numpy.int64)))
+        firsts = [prim.vertex(0).point().number() if count else offset for prim, count, offset in zip(prims, counts, offsets)]
+        if offsets[-1] == len(positions) and numpy.array_equal(firsts, offsets[:-1]) :
+            return names, numpy.split(positions, offsets[1:-1])
+        return names, [positions[[point.number() for point in prim.points()]] for prim in prims]
+
+    # names and points of shapes in scene pixels from geo, or from disk cache without cooking the asset
+    def shapePolygons(self) :
+        cached = self.cachedResults()
+        if cached is not None :
+            names, polygons = cached[0], cached[1]
+        else :
+            names, polygons = self.fetchPolygons()
+        return names, [numpy.asarray(polygon).astype(numpy.int64).astype(numpy.float64).reshape(-1, 2) for polygon in polygons]
+
+    # map and rotation the shapes were detected on
+    def shapesSource(self) :
+        return (self.asset, self.asset.parm("texpath").eval(), self.asset.parmTuple("rot").eval())
+
+    # build shapes, their points are kept for matching and stats without reading Qt items
     def updateShapes(self) :
-        poly = self.asset.node("geo/POLYGONS")
-        geo = poly.geometry()
+        names, polygons = self.shapePolygons()
+        self.shapesKey = self.shapesSource()
+        self.polygons = polygons
 
         # cleanup old shapes
-        current_names = set(prim.attribValue("name") for prim in geo.prims())
         for i in range(len(self.shapes)) :
-            if i >= len(current_names) :
+            if i >= len(names) :
                 item = self.shapes.pop(-1)
                 self.scene.removeItem(item)
                 del item
 
         # create new shapes
-        for i, prim in enumerate(geo.prims()) :
-            name = prim.attribValue("name")
-            points = prim.points()
-            coords = []
-            for point in points :
-                pos = point.position()
-                coords.append(QPointF(int(pos[0]), int(pos[1])))
-            polygon = QPolygonF(coords)
+        for i, name in enumerate(names) :
+            polygon = self.toPolygon(polygons[i])
 
             if i >= len(self.shapes) :
                 self.shapes.append(LightShapeItem(polygon))
@@ -779,6 +1254,77 @@ class HdrView(QWidget) :
                 self.scene.addItem(self.shapes[i])
             else :
                 self.shapes[i].setPolygon(polygon)
+                self.shapes[i].setName(name)
+
+    # Called by the panel inside undo group of the detection parms it has just set,
+    # so undo and redo restore detection and light parms together and never match again.
+    # Shapes of the same map and rotation give light parms to matching new shapes,
+    # another map or rotation moves every highlight, then lights keep their indices
+    def keepLights(self) :
+        if not self.shapes or self.shapesKey != self.shapesSource() :
+            return
+        polygons = self.shapePolygons()[1]
+        self.keepLightParms(self.polygons, polygons)
+        self.polygons = polygons
+
+    # Move light parms to new indices of the same highlights,
+    # matched by polygon centers on the sphere. Unmatched new lights get default parms.
+    # When most of lights are not matched, detection changed too much to trust matching
+    # and parms stay by index
+    def keepLightParms(self, oldPolygons, newPolygons) :
+        width, height = self.background.width(), self.background.height()
+        def directions(polygons) :
+            centers = [polygon.mean(axis=0) for polygon in polygons]
+            return lighter_detect.sphere_directions(centers, width, height)
+        match = lighter_detect.match_directions(directions(oldPolygons), directions(newPolygons))
+        if len(match) == len(oldPolygons) and numpy.array_equal(match, numpy.arange(len(match))) :
+            return
+        if numpy.count_nonzero(match < 0) * 2 > len(match) :
+            return
+
+        node = self.asset
+        values = []
+        for i in range(len(oldPolygons)) :
+            light = {}
+            for name in self.LIGHT_PARMS :
+                parm = node.parm(name.replace("#", str(i+1)))
+                if parm is None or parm.isAtDefault() :
+                    light[name] = None
+                elif parm.parmTemplate().type() == hou.parmTemplateType.String :
+                    light[name] = parm.unexpandedString()
+                else :
+                    light[name] = parm.eval()
+            values.append(light)
+
+        node.parm("lights").set(len(newPolygons))
+        for j, i in enumerate(match) :
+            light = values[i] if i >= 0 else {}
+            for name in self.LIGHT_PARMS :
+                parm = node.parm(name.replace("#", str(j+1)))
+                if light.get(name) is None :
+                    parm.revertToDefaults()
+                else :
+                    parm.set(light[name])
+
+    # light stats of every shape. Polygons are rasterized in detect resolution,
+    # shapes, labels and stats are saved to disk cache for next opening of the map
+    def shapeStats(self) :
+        cached = self.cachedResults()
+        if cached is not None and len(cached[0]) == len(self.shapes) :
+            return cached[3]
+        image = self.detector().image
+        width, height = lighter_detect.detect_res(self.asset.parm("detectres").eval())
+        scale = width / float(self.background.width())
+        polygons = self.polygons
+        labels = lighter_detect.rasterize([polygon * scale for polygon in polygons], width, height)
+        stats = lighter_detect.region_stats(image, labels, len(polygons))
+        key = self.cacheKey()
+        if key is not None :
+            names = [shape.name for shape in self.shapes]
+            self.diskCache.save(key, names, polygons, labels, stats)
+            self.cached = (names, polygons, labels, stats)
+            self.cachedKey = key
+        return stats
 
     def selectShape(self, index) :
         for shape in self.shapes :
@@ -788,17 +1334,173 @@ class HdrView(QWidget) :
             self.shapes[index].setSelected(True)
             self.shapes[index].updateColor()
 
+"""
+Collects refresh requests of panel widgets and runs them at most once per interval
+Stages run in fixed order (map, shapes, tabs, baked flags), each once however many
+times it was requested. Stage requested while running earlier stage runs in the same pass.
+"""
+class UpdateScheduler(QObject) :
+    STAGES = ("hdr", "shapes", "tabs", "baked")
+
+    def __init__(self, interval=16, parent=None) :
+        super().__init__(parent)
+        self.handlers = {}
+        self.dirty = set()
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(interval)
+        self.timer.timeout.connect(self.flush)
+
+    def setHandler(self, stage, handler) :
+        self.handlers[stage] = handler
+
+    def request(self, *stages) :
+        self.dirty.update(stages)
+        if not self.timer.isActive() :
+            self.timer.start()
+
+    def flush(self) :
+        for stage in self.STAGES :
+            if stage in self.dirty :
+                self.dirty.discard(stage)
+                self.handlers[stage]()
+
+"""
+Keeps panel widgets in sync with node parameters by node event callbacks
+Changed parm tuples are collected and only widgets linked to them read values again,
+so scripted and undo changes don't rebuild the panel.
+"""
+class ParmSync(QObject) :
+    def __init__(self, parent=None) :
+        super().__init__(parent)
+        self.node = None
+        self.groups = {}
+        self.widgets = {}
+        self.changed = set()
+        self.syncing = False
+        self.handler = None
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(0)
+        self.timer.timeout.connect(self.flush)
+
+    def setNode(self, node) :
+        if node == self.node :
+            return
+        if self.node is not None :
+            try :
+                self.node.removeEventCallback((hou.nodeEventType.ParmTupleChanged,), self.onEvent)
+            except (hou.ObjectWasDeleted, hou.OperationFailed) :
+                pass
+        self.node = node
+        self.changed = set()
+        if self.node is not None :
+            self.node.addEventCallback((hou.nodeEventType.ParmTupleChanged,), self.onEvent)
+
+    # handler gets set of changed tuple names, None in the set means unknown parms
+    def setHandler(self, handler) :
+        self.handler = handler
+
+    # widgets of one owner replace widgets it linked before
+    def bind(self, owner, widgets) :
+        self.groups[owner] = widgets
+        self.widgets = {}
+        for group in self.groups.values() :
+            for widget in group :
+                parm = widget.parm
+                name = parm.name() if isinstance(parm, hou.ParmTuple) else parm.tuple().name()
+                self.widgets.setdefault(name, []).append(widget)
+
+    # changes made while widgets are synced are their own echo
+    def onEvent(self, **kwargs) :
+        if self.syncing :
+            return
+        parm_tuple = kwargs.get("parm_tuple")
+        self.changed.add(parm_tuple.name() if parm_tuple is not None else None)
+        if not self.timer.isActive() :
+            self.timer.start()
+
+    def flush(self) :
+        names, self.changed = self.changed, set()
+        if None in names :
+            widgets = [widget for group in self.widgets.values() for widget in group]
+        else :
+            widgets = [widget for name in names for widget in self.widgets.get(name, ())]
+        self.syncing = True
+        try :
+            for widget in widgets :
+                # value of dragged slider comes from the widget itself
+                if isinstance(widget, SliderParm) and widget._slider.isSliderDown() :
+                    continue
+                widget.setParm(widget.parm)
+        finally :
+            self.syncing = False
+        if self.handler is not None :
+            self.handler(names)
+
+"""
+Viewer tone mapping settings, they are not stored on the node
+Exposure, gamma and curve are applied to float copy of the map without cooking,
+OCIO View shows the map made by VIEW network of the asset.
+"""
+class ViewSettings(QWidget) :
+    def __init__(self, hdrView, parent=None) :
+        super().__init__(parent)
+        self.hdrView = hdrView
+
+        self.curve = ComboBoxField("Tone Map")
+        self.curve.addValues(["OCIO View", "Linear", "Reinhard", "Filmic"], ["view", "linear", "reinhard", "filmic"])
+        self.exposure = SliderParm(hou.qt.InputField.FloatType, "View Exposure", (-10.0, 10.0))
+        self.gamma = SliderParm(hou.qt.InputField.FloatType, "Gamma", (1.0, 3.0))
+        self.exposure.setValue(0.0)
+        self.gamma.setValue(2.2)
+
+        self.curve.setToolTip("Tone curve of the viewer\nOCIO View - map as VIEW network of the asset shows it\nOther curves are computed from HDR pixels without cooking")
+        self.exposure.setToolTip("Viewer exposure in stops, doesn't change the lights")
+        self.gamma.setToolTip("Viewer gamma")
+
+        self.curve.field.currentIndexChanged.connect(self.updateView)
+        for slider in (self.exposure, self.gamma) :
+            slider._field.editingFinished.connect(self.updateView)
+            slider._slider.valueChanged.connect(self.updateView)
+
+        layout = QHBoxLayout()
+        layout.setSpacing(0)
+        layout.setContentsMargins(2, 2, 2, 2)
+        layout.addWidget(self.curve,2)
+        layout.addWidget(self.exposure,3)
+        layout.addWidget(self.gamma,2)
+        self.setLayout(layout)
+        self.updateView()
+
+    def updateView(self) :
+        curve = self.curve.getValue()
+        self.exposure.setEnabled(curve != "view")
+        self.gamma.setEnabled(curve != "view")
+        tone = (self.exposure.getValue(), self.gamma.getValue(), curve)
+        if tone != self.hdrView.tone :
+            self.hdrView.setTone(*tone)
+
 """
 General parameters widget
 Store parameters for loading and saving 
 and for highlights detection
 """
 class ParmsView(QWidget) :
+    DETECT_PARMS = {"texpath", "detectres", "clip", "blursize", "size", "threshold", "rot"}
+
     def __init__(self, hdrView, parent=None) :
         super().__init__(parent)
         self.node = None
         self.hdrView = hdrView
         self.lightsView = None
+        self.scheduler = UpdateScheduler(parent=self)
+        self.scheduler.setHandler("hdr", lambda : self.hdrView.setHDR(self.hdrView.cop))
+        self.scheduler.setHandler("shapes", lambda : self.hdrView.updateShapes())
+        self.scheduler.setHandler("tabs", lambda : self.lightsView.buildTabs())
+        self.scheduler.setHandler("baked", self.checkBakedFlag)
+        self.sync = ParmSync(parent=self)
+        self.sync.setHandler(self.onParmsChanged)
         
         self.primpath = TextField("Prim Path")
         self.extract = Button("Extract Lights")
@@ -810,8 +1512,11 @@ class ParmsView(QWidget) :
         self.texRes.addValues(["64 x 64", "128 x 128", "256 x 256", "512 x 512"], [64, 128, 256, 512])
         self.blur_tex = SliderParm(hou.qt.InputField.FloatType, "Light Bake Blur", (0.0,10000.0))
         self.bakeall = Button("Bake All Textures")
+        self.parallel = CheckBox("Parallel Bake")
+        self.workers = SliderParm(hou.qt.InputField.IntegerType, "Workers", (0,64))
         self.hdrRes = ComboBoxField("Detect Map Res")
         self.hdrRes.addValues(["512 x 256", "1024 x 512", "2048 x 1024"], [512, 1024, 2048])
+        self.auto = Button("Auto")
         self.clip = SliderParm(hou.qt.InputField.FloatType, "Clip Lights", (10.0,5000.0))
         self.blur = SliderParm(hou.qt.InputField.FloatType, "Blur", (0.0,10000.0))
         self.reshape = SliderParm(hou.qt.InputField.IntegerType, "Dilate/Erode", (-10,10))
@@ -827,7 +1532,10 @@ class ParmsView(QWidget) :
         self.texRes.setToolTip("lightres\nResolution of the baked individual light texture")
         self.blur_tex.setToolTip("blurtex\nBlur size of the baked individual light texture")
         self.bakeall.setToolTip("bake\nBake all light textures\nIt will go through all tabs and bake textures for each light\nIf button color is green - all textures are baked\nIf button color is red - some textures can need to bake")
+        self.parallel.setToolTip("bake_parallel\nBake light textures in background hython processes\nEnvironment map is baked in this session meanwhile")
+        self.workers.setToolTip("bake_workers\nNumber of background hython processes\n0 - number of CPU cores")
         self.hdrRes.setToolTip("lightres\nResolution of the HDR map used for detection")
+        self.auto.setToolTip("Propose Clip Lights and Threshold from the histogram of the HDR map\nAsset is cooked once with new values")
         self.clip.setToolTip("clip\nClip higlights threshold")
         self.blur.setToolTip("blursize\nBlur size of the higlights for shape smoothing")
         self.reshape.setToolTip("size\nDilate/Erode size of the higlights for glueing nearest shapes")
@@ -840,23 +1548,24 @@ class ParmsView(QWidget) :
 
         self.file.field.textChanged.connect(self.update_hdr)
         self.texRes.field.currentIndexChanged.connect(self.drawView)
+        self.hdrRes.commit = self.commitDetection
         self.hdrRes.field.currentIndexChanged.connect(self.drawView)
-        self.clip._field.editingFinished.connect(self.drawView)
-        self.clip._slider.valueChanged.connect(self.drawView)
-        self.blur._field.editingFinished.connect(self.drawView)
-        self.blur._slider.valueChanged.connect(self.drawView)
-        self.reshape._field.editingFinished.connect(self.drawView)
-        self.reshape._slider.valueChanged.connect(self.drawView)
-        self.threshold._field.editingFinished.connect(self.drawView)
-        self.threshold._slider.valueChanged.connect(self.drawView)
+        for slider in (self.clip, self.blur, self.reshape, self.threshold) :
+            slider.commit = self.commitDetection
+            slider._field.editingFinished.connect(self.drawView)
+            slider._slider.valueChanged.connect(self.previewView)
+            slider._slider.sliderReleased.connect(slider.updateParm)
+            slider._slider.sliderReleased.connect(self.drawView)
         self.rot.field.editingFinished.connect(self.drawView)
+        self.auto.button.clicked.connect(self.autoDetect)
+        self.parallel.toggle.toggled.connect(self.workers.setEnabled)
 
-        self.mapRes.field.currentIndexChanged.connect(self.checkBakedFlag)
-        self.output.field.textChanged.connect(self.checkBakedFlag)
-        self.blur_tex._field.editingFinished.connect(self.checkBakedFlag)
-        self.blur_tex._slider.valueChanged.connect(self.checkBakedFlag)
+        self.mapRes.field.currentIndexChanged.connect(self.requestBakedFlag)
+        self.output.field.textChanged.connect(self.requestBakedFlag)
+        self.blur_tex._field.editingFinished.connect(self.requestBakedFlag)
+        self.blur_tex._slider.valueChanged.connect(self.requestBakedFlag)
         self.bakeall.button.clicked.connect(self.updateParms)
-        self.bakeall.button.clicked.connect(self.checkBakedFlag)
+        self.bakeall.button.clicked.connect(self.requestBakedFlag)
 
         prim_layout = QHBoxLayout()
         prim_layout.setSpacing(0)
@@ -876,11 +1585,23 @@ class ParmsView(QWidget) :
         res_layout.addWidget(self.mapRes)
         res_layout.addWidget(self.texRes)
 
+        parallel_layout = QHBoxLayout()
+        parallel_layout.setSpacing(0)
+        parallel_layout.setContentsMargins(2, 2, 2, 2)
+        parallel_layout.addWidget(self.parallel,1)
+        parallel_layout.addWidget(self.workers,3)
+
+        detect_layout = QHBoxLayout()
+        detect_layout.setSpacing(0)
+        detect_layout.setContentsMargins(0, 0, 0, 0)
+        detect_layout.addWidget(self.hdrRes,3)
+        detect_layout.addWidget(self.auto,1)
+
         group_box = CollapsableBox("Hightlights Detection")
 
         box_layout = QVBoxLayout()
         box_layout.setSpacing(0)
-        box_layout.addWidget(self.hdrRes)
+        box_layout.addLayout(detect_layout)
         box_layout.addWidget(self.clip)
         box_layout.addWidget(self.blur)
         box_layout.addWidget(self.reshape)
@@ -895,6 +1616,7 @@ class ParmsView(QWidget) :
         layout.addLayout(out_layout)
         layout.addLayout(res_layout)
         layout.addWidget(self.blur_tex)
+        layout.addLayout(parallel_layout)
         layout.addWidget(group_box)
         layout.addSpacing(10)
         layout.addWidget(self.intensity)
@@ -903,6 +1625,7 @@ class ParmsView(QWidget) :
 
     def setNode(self, node) :
         self.node = node
+        self.sync.setNode(node)
 
     def setLightsView(self, lightsView) :
         self.lightsView = lightsView
@@ -916,6 +1639,9 @@ class ParmsView(QWidget) :
         self.blur_tex.setParm(self.node.parm("blurtex"))
         self.bakeall.setParm(self.node.parm("bake"))
         self.texRes.setParm(self.node.parm("lightres"))
+        self.parallel.setParm(self.node.parm("bake_parallel"))
+        self.workers.setParm(self.node.parm("bake_workers"))
+        self.workers.setEnabled(self.parallel.getValue())
         self.hdrRes.setParm(self.node.parm("detectres"))
         self.clip.setParm(self.node.parm("clip"))
         self.blur.setParm(self.node.parm("blursize"))
@@ -923,6 +1649,19 @@ class ParmsView(QWidget) :
         self.threshold.setParm(self.node.parm("threshold"))
         self.rot.setParm(self.node.parmTuple("rot"))
         self.intensity.setParm(self.node.parm("intensity"))
+        self.sync.bind(self, [self.primpath, self.file, self.output, self.mapRes, self.blur_tex, self.texRes, self.hdrRes,
+                              self.parallel, self.workers,
+                              self.clip, self.blur, self.reshape, self.threshold, self.rot, self.intensity])
+
+    # parms changed on the node by panel, scripts or undo. Widgets are already synced,
+    # detection parms rebuild the map, others can only change baked flags
+    def onParmsChanged(self, names) :
+        sliders = (self.clip, self.blur, self.reshape, self.threshold)
+        if names & self.DETECT_PARMS and not any(slider._slider.isSliderDown() for slider in sliders) :
+            self.drawView()
+        else :
+            self.requestBakedFlag()
+            self.lightsView.refreshTable()
 
     # Crutch for solving problem when Cancel button in FileParm widget pressed
     def FileLineEditCrutch(self) :
@@ -931,21 +1670,57 @@ class ParmsView(QWidget) :
         if file == "" or output == "" :
             self.updateParms()
     
+    # while slider is dragged show headless detection of the widget values,
+    # parm is set and asset is cooked on release
+    def previewView(self) :
+        sliders = (self.clip, self.blur, self.reshape, self.threshold)
+        if not any(slider._slider.isSliderDown() for slider in sliders) :
+            self.drawView()
+            return
+        self.hdrView.previewAsync(clip=self.clip.getValue(),
+                                  blursize=self.blur.getValue(),
+                                  size=int(self.reshape.getValue()),
+                                  threshold=self.threshold.getValue(),
+                                  detectres=self.node.parm("detectres").eval())
+
+    # Detection parm set by panel widgets. Light parms are matched to the new shapes
+    # in the same undo group, so one undo reverts both. Asset is cooked there for the shapes
+    def commitDetection(self, parm, value) :
+        if parm.eval() == value :
+            return
+        with hou.undos.group(f"Lighter {parm.description()}") :
+            parm.set(value)
+            parm.pressButton()
+            self.hdrView.keepLights()
+
+    # propose clip and threshold from the map and current blur and size, sliders and view are updated by node events
+    def autoDetect(self) :
+        detector = self.hdrView.detector()
+        clip, threshold = lighter_detect.auto_params(detector.image,
+                                                     detectres=self.node.parm("detectres").eval(),
+                                                     blursize=self.node.parm("blursize").eval(),
+                                                     size=self.node.parm("size").eval(),
+                                                     wrap=detector.wrap)
+        with hou.undos.group("Lighter Auto Detection") :
+            self.node.parm("clip").set(clip)
+            self.node.parm("threshold").set(threshold)
+            self.hdrView.keepLights()
+
+    # cook the asset and rebuild everything on the next scheduler pass
     def drawView(self) :
-        self.hdrView.setHDR(self.hdrView.cop)
-        self.hdrView.updateShapes()
-        self.lightsView.buildTabs()
-        self.checkBakedFlag()
+        self.hdrView.setPreview(None)
+        self.scheduler.request("hdr", "shapes", "tabs", "baked")
+
+    def requestBakedFlag(self) :
+        self.scheduler.request("baked")
 
     def update_hdr(self) :
         current_path = self.node.parm("texpath").eval()
         new_path = self.file.getValue()
         if current_path != new_path and os.path.exists(hou.text.expandString(new_path)) :
             self.node.parm("texpath").set(self.file.getValue())
-            self.hdrView.setHDR(self.hdrView.cop)
-            self.checkBakedFlag()
-        self.hdrView.updateShapes()
-        self.lightsView.buildTabs()
+            self.scheduler.request("hdr", "baked")
+        self.scheduler.request("shapes", "tabs")
     
     # Check for all baked flags on node and switch buttons color
     def checkBakedFlag(self) :
@@ -960,10 +1735,179 @@ class ParmsView(QWidget) :
         all_color = Colors.baked if check else Colors.needBake
         self.bakeall.setColor(all_color)
 
+"""
+Tab with parameters of one light shape
+Widgets are created once and rebound to parameters of other light by index
+"""
+class LightTab(QWidget) :
+    def __init__(self, lightParms, parent=None) :
+        super().__init__(parent)
+        self.lightParms = lightParms
+        self.index = -1
+
+        self.separate_toggle = CheckBox("Separate Light")
+        self.renderable_toggle = CheckBox("Renderable")
+        self.fill_toggle = CheckBox("Fill Background")
+        self.color = ColorField("Color Tint")
+        self.exposure = SliderParm(hou.qt.InputField.FloatType, "Exposure", (-2000.0,2000.0))
+        self.light_name = TextField("Name")
+        self.lpe = TextField("                LPE Tag")
+        self.light_type = ComboBoxField("Light Type")
+        self.light_type.addValues(["Distant", "Point", "Sphere", "Disc", "Rectangle"], [0,1,2,3,4])
+        self.distant_angle = SliderParm(hou.qt.InputField.FloatType, "    Distant Angle", (0.0,6000.0))
+        self.distance = SliderParm(hou.qt.InputField.FloatType, "Distance", (0.0,10000.0))
+        self.use_texture = CheckBox("Use Texture")
+        self.bake_texture = Button(f"Bake Light Texture")
+        self.info = QLabel()
+        self.info.setToolTip("Light of the highlight in the HDR map\nEnergy - part of the whole map light\nRadiance - luminance integrated over solid angle\nSolid Angle - size of the highlight on the sphere\nPeak - the brightest pixel luminance\nMean Color - average color weighted by solid angle")
+
+        # connect widgets to each other
+        self.separate_toggle.toggle.toggled.connect(self.setSeparated)
+        self.separate_toggle.toggle.toggled.connect(self.requestBakedFlag)
+        self.fill_toggle.toggle.toggled.connect(self.setFilled)
+        self.fill_toggle.toggle.toggled.connect(self.requestBakedFlag)
+        self.color.colorField.valueChanged.connect(self.requestBakedFlag)
+        self.exposure._field.editingFinished.connect(self.requestBakedFlag)
+        self.exposure._slider.valueChanged.connect(self.requestBakedFlag)
+        self.bake_texture.button.clicked.connect(self.requestBakedFlag)
+
+        # set rules for widgets activation
+        #                              Sep   Type   UseTex
+        self.renderable_toggle.rule = [True, None,  None]
+        self.fill_toggle.rule =       [None, None,  None]
+        self.light_name.rule =        [True, None,  None]
+        self.lpe.rule =               [True, None,  None]
+        self.light_type.rule =        [True, None,  None]
+        self.distant_angle.rule =     [True, True,  None]
+        self.distance.rule =          [True, None,  None]
+        self.use_texture.rule =       [True, False, None]
+        self.bake_texture.rule =      [None, None,  None]
+
+        self.separate_toggle.toggle.toggled.connect(self.activateParms)
+        self.light_type.field.currentIndexChanged.connect(self.activateParms)
+        self.use_texture.toggle.toggled.connect(self.activateParms)
+
+        toggles_layout = QHBoxLayout()
+        toggles_layout.setSpacing(2)
+        toggles_layout.setContentsMargins(0, 0, 0, 0)
+        toggles_layout.addWidget(self.separate_toggle)
+        toggles_layout.addWidget(self.fill_toggle)
+        toggles_layout.addWidget(self.renderable_toggle)
+
+        name_layout = QHBoxLayout()
+        name_layout.setSpacing(2)
+        name_layout.setContentsMargins(0, 0, 0, 0)
+        name_layout.addWidget(self.light_name)
+        name_layout.addWidget(self.lpe)
+
+        type_layout = QHBoxLayout()
+        type_layout.setSpacing(2)
+        type_layout.setContentsMargins(0, 0, 0, 0)
+        type_layout.addWidget(self.light_type,2)
+        type_layout.addWidget(self.distant_angle,3)
+
+        tex_layout = QHBoxLayout()
+        tex_layout.setSpacing(2)
+        tex_layout.setContentsMargins(0, 0, 0, 0)
+        tex_layout.addWidget(self.use_texture,2)
+        tex_layout.addWidget(self.bake_texture,3)
+
+        layout = QVBoxLayout()
+        layout.setSpacing(2)
+        layout.setContentsMargins(2, 10, 2, 2)
+        layout.addLayout(toggles_layout)
+        layout.addWidget(self.color)
+        layout.addWidget(self.exposure)
+        layout.addLayout(name_layout)
+        layout.addLayout(type_layout)
+        layout.addWidget(self.distance)
+        layout.addLayout(tex_layout)
+        layout.addWidget(self.info)
+
+        self.setLayout(layout)
+        self.setSizePolicy(QSizePolicy.Preferred, QSizePolicy.Preferred)
+
+    # link widgets to parameters of light with given index (starts from 0)
+    def bind(self, node, index, stats) :
+        self.index = index
+        i = index
+        self.separate_toggle.setParm(node.parm(f"separate{i+1}"))
+        self.renderable_toggle.setParm(node.parm(f"renderable{i+1}"))
+        self.fill_toggle.setParm(node.parm(f"fill{i+1}"))
+        self.color.setParm(node.parmTuple(f"clr{i+1}"))
+        self.exposure.setParm(node.parm(f"exposure{i+1}"))
+        self.light_name.setParm(node.parm(f"name{i+1}"))
+        self.lpe.setParm(node.parm(f"lpe{i+1}"))
+        self.light_type.setParm(node.parm(f"lighttype{i+1}"))
+        self.distant_angle.setParm(node.parm(f"dist_angle{i+1}"))
+        self.distance.setParm(node.parm(f"dist{i+1}"))
+        self.use_texture.setParm(node.parm(f"use_tex{i+1}"))
+        self.bake_texture.setParm(node.parm(f"bake{i+1}"))
+
+        self.separate_toggle.setToolTip(f"separate{i+1}\nSeparate Light from the HDR map")
+        self.renderable_toggle.setToolTip(f"renderable{i+1}\nMake Light renderable")
+        self.fill_toggle.setToolTip(f"fill{i+1}\nDelete highlight from the HDR map (Fill with nearest colors)")
+        self.color.setToolTip(f"clr{i+1}r, clr{i+1}g, clr{i+1}b\nLight Color multiplier")
+        self.exposure.setToolTip(f"exposure{i+1}\nLight Exposure")
+        self.light_name.setToolTip(f"name{i+1}\nLight Name")
+        self.lpe.setToolTip(f"lpe{i+1}\nLight LPE Tag")
+        self.light_type.setToolTip(f"lighttype{i+1}\nLight Type Definition\nTexture can be used only for Rectangle Light")
+        self.distant_angle.setToolTip(f"dist_angle{i+1}\nDistant Light Angle\n (size of shape meashured in degrees from the center of imaginary sphere)")
+        self.distance.setToolTip(f"dist{i+1}\nLight Distance from center. Usable for all instead distant light.\n When Light in distant mode it just move icon in 3d space but not change lighting")
+        self.use_texture.setToolTip(f"use_tex{i+1}\nUse Texture for Rectangle Light")
+        self.bake_texture.setToolTip(f"bale{i+1}\nBake current light Texture\nIf button color is green - texture is baked\nIf button color is red - texture need to bake")
+
+        r, g, b = stats.color[i]
+        self.info.setText(f"Energy {stats.share[i]*100:.1f}%   Radiance {stats.energy[i]:.3g}   Solid Angle {stats.solid_angle[i]:.3g} sr"
+                          f"   Peak {stats.peak[i]:.3g}   Mean Color {r:.3g} {g:.3g} {b:.3g}")
+
+        # toggles may keep their state from previous light, so shape and tab are updated explicitly
+        self.setSeparated(self.separate_toggle.getValue())
+        self.activateParms()
+
+    def parmWidgets(self) :
+        return [self.separate_toggle, self.renderable_toggle, self.fill_toggle, self.color, self.exposure, self.light_name,
+                self.lpe, self.light_type, self.distant_angle, self.distance, self.use_texture]
+
+    def shape(self) :
+        shapes = self.lightParms.hdrView.shapes
+        return shapes[self.index] if 0 <= self.index < len(shapes) else None
+
+    def setSeparated(self, checked) :
+        shape = self.shape()
+        if shape is not None :
+            shape.setSeparated(checked)
+        # set color for tabs of separated lights
+        color = Colors.tabSep if checked else Colors.tabDef
+        self.lightParms.tabBar().setTabTextColor(self.index+1, QColor.fromRgb(*color))
+        self.lightParms.refreshTable()
+
+    def setFilled(self, checked) :
+        shape = self.shape()
+        if shape is not None :
+            shape.setFilled(checked)
+        self.lightParms.refreshTable()
+
+    def requestBakedFlag(self) :
+        if self.lightParms.parmsView is not None :
+            self.lightParms.parmsView.requestBakedFlag()
+
+    # activate widgets by rules. Not beautiful but works ))
+    def activateParms(self) :
+        tests = [self.separate_toggle.toggle.isChecked(),
+                 self.light_type.field.currentIndex()==0,
+                 self.use_texture.toggle.isChecked()]
+        widgets = (self.renderable_toggle, self.light_name, self.lpe, self.light_type,
+                   self.distant_angle, self.distance, self.use_texture, self.bake_texture)
+        for widget in widgets :
+            state = all([tests[i]==widget.rule[i] for i in range(len(tests)) if widget.rule[i] is not None])
+            widget.setEnabled(state)
+
 """
 Light parameters widget
 First tab is for environment light
 Other tabs are for light shapes
+Tabs of light shapes are kept in pool and hidden when not used
 """
 class LightParms(QTabWidget):
     def __init__(self, parent=None):
@@ -972,11 +1916,13 @@ class LightParms(QTabWidget):
         self.hdrView = None
         self.parmsView = None
         self.tabs = []
+        self.lightsCount = 0
         self.seps = []
         self.fills = []
         self.envBake = None
         self.buttons = []
         self.envTab = None
+        self.lightTable = None
 
         self.setSizePolicy(QSizePolicy.Preferred, QSizePolicy.Preferred)
         self.currentChanged.connect(self.onTabChange)
@@ -1004,48 +1950,55 @@ class LightParms(QTabWidget):
     def setParmsView(self, parmsView) :
         self.parmsView = parmsView
 
+    def setLightTable(self, lightTable) :
+        self.lightTable = lightTable
+
+    # widgets linked to parms of env and all used lights
+    def boundWidgets(self) :
+        widgets = [self.use_env, self.env_color, self.env_exposure, self.env_light_name, self.env_lpe]
+        for tab in self.tabs[:self.lightsCount] :
+            widgets.extend(tab.parmWidgets())
+        return widgets
+
+    # light table shows parms only while it is visible, hidden table is refreshed when shown
+    def refreshTable(self) :
+        if self.lightTable is not None and self.lightTable.isVisible() :
+            self.lightTable.lights.refresh()
+
+    # rotation widget is synced by node events, only map and shapes are redrawn
     def updateParmsView(self) :
-        self.parmsView.updateParms()
         self.parmsView.drawView()
     
     # environment map tab is always first
     def buildEnvTab(self) :
-        use_env = CheckBox("Use EnvLight")
-        env_color = ColorField("Color Tint")
-        env_exposure = SliderParm(hou.qt.InputField.FloatType, "Exposure", (-1500.0,1500.0))
-        env_light_name = TextField("Name")
-        env_lpe = TextField("                LPE Tag")
+        self.use_env = CheckBox("Use EnvLight")
+        self.env_color = ColorField("Color Tint")
+        self.env_exposure = SliderParm(hou.qt.InputField.FloatType, "Exposure", (-1500.0,1500.0))
+        self.env_light_name = TextField("Name")
+        self.env_lpe = TextField("                LPE Tag")
         self.envBake = Button(f"Bake EnvLight Texture")
 
-        use_env.setParm(self.node.parm("use_env"))
-        env_color.setParm(self.node.parmTuple("env_clr"))
-        env_exposure.setParm(self.node.parm("env_exposure"))
-        env_light_name.setParm(self.node.parm("env_name"))
-        env_lpe.setParm(self.node.parm("env_lpe"))
-        self.envBake.setParm(self.node.parm("bake_env"))
-
-        use_env.setToolTip("use_env\nUse Environment Light")
-        env_color.setToolTip("env_clrr, env_clrg, env_clrb\nEnvironment Light Color multiplier")
-        env_exposure.setToolTip("env_exposure\nEnvironment Light Exposure")
-        env_light_name.setToolTip("env_name\nEnvironment Light Name")
-        env_lpe.setToolTip("env_lpe\nEnvironment Light LPE Tag")
+        self.use_env.setToolTip("use_env\nUse Environment Light")
+        self.env_color.setToolTip("env_clrr, env_clrg, env_clrb\nEnvironment Light Color multiplier")
+        self.env_exposure.setToolTip("env_exposure\nEnvironment Light Exposure")
+        self.env_light_name.setToolTip("env_name\nEnvironment Light Name")
+        self.env_lpe.setToolTip("env_lpe\nEnvironment Light LPE Tag")
         self.envBake.setToolTip("bake_env\nBake Environment Light Texture\nIf button color is green - texture is baked\nIf button color is red - texture need to bake")
 
-        self.envBake.button.clicked.connect(self.parmsView.checkBakedFlag)
+        self.envBake.button.clicked.connect(self.parmsView.requestBakedFlag)
 
         def toggle_widgets(checked, widgets):
             for widget in widgets:
                 widget.setEnabled(checked)
 
-        toggle_func = partial(toggle_widgets, widgets=[env_color, env_exposure, env_light_name, env_lpe])
-        use_env.toggle.toggled.connect(toggle_func)
-        toggle_func(use_env.toggle.isChecked())
+        self.toggle_env = partial(toggle_widgets, widgets=[self.env_color, self.env_exposure, self.env_light_name, self.env_lpe])
+        self.use_env.toggle.toggled.connect(self.toggle_env)
 
         env_name_layout = QHBoxLayout()
         env_name_layout.setSpacing(2)
         env_name_layout.setContentsMargins(0, 0, 0, 0)
-        env_name_layout.addWidget(env_light_name)
-        env_name_layout.addWidget(env_lpe)
+        env_name_layout.addWidget(self.env_light_name)
+        env_name_layout.addWidget(self.env_lpe)
 
         env_bake_layout = QHBoxLayout()
         env_bake_layout.setSpacing(2)
@@ -1056,9 +2009,9 @@ class LightParms(QTabWidget):
         env_layout = QVBoxLayout()
         env_layout.setSpacing(2)
         env_layout.setContentsMargins(2, 10, 2, 2)
-        env_layout.addWidget(use_env)
-        env_layout.addWidget(env_color)
-        env_layout.addWidget(env_exposure)
+        env_layout.addWidget(self.use_env)
+        env_layout.addWidget(self.env_color)
+        env_layout.addWidget(self.env_exposure)
         env_layout.addLayout(env_name_layout)
         env_layout.addStretch()
         env_layout.addLayout(env_bake_layout)
@@ -1066,175 +2019,242 @@ class LightParms(QTabWidget):
         self.envTab = QWidget()
         self.envTab.setLayout(env_layout)
         self.envTab.setSizePolicy(QSizePolicy.Preferred, QSizePolicy.Preferred)
-        self.addTab(self.envTab, "Env")     
+        self.addTab(self.envTab, "Env")
+
+    def bindEnvTab(self) :
+        self.use_env.setParm(self.node.parm("use_env"))
+        self.env_color.setParm(self.node.parmTuple("env_clr"))
+        self.env_exposure.setParm(self.node.parm("env_exposure"))
+        self.env_light_name.setParm(self.node.parm("env_name"))
+        self.env_lpe.setParm(self.node.parm("env_lpe"))
+        self.envBake.setParm(self.node.parm("bake_env"))
+        self.toggle_env(self.use_env.toggle.isChecked())
 
-    # dinamicaly build tabs for all light shapes
+    # bind tabs from the pool to all light shapes. New tabs are created only
+    # when there are more shapes than ever before, extra tabs are hidden
     def buildTabs(self) :
-        # Create widgets
-        self.node.parm("lights").set(len(self.hdrView.shapes))
-        
-        self.envTab = None
-        for i in range(len(self.tabs)) :
-            tab = self.tabs.pop(0)
-            sep = self.seps.pop(0)
-            fil = self.fills.pop(0)
-            buttons = self.buttons.pop(0)
-            del tab
-            del sep
-            del fil
-            del buttons
-
-        for i in range(self.count()) :
-            self.removeTab(0)
-
-        self.buildEnvTab()
-        # iterate over shapes and create tabs
-        for i in range(len(self.hdrView.shapes)) :
-            shape = self.hdrView.shapes[i]
-            separate_toggle = CheckBox("Separate Light")
-            renderable_toggle = CheckBox("Renderable")
-            fill_toggle = CheckBox("Fill Background")
-            color = ColorField("Color Tint")
-            exposure = SliderParm(hou.qt.InputField.FloatType, "Exposure", (-2000.0,2000.0))
-            light_name = TextField("Name")
-            lpe = TextField("                LPE Tag")
-            light_type = ComboBoxField("Light Type")
-            light_type.addValues(["Distant", "Point", "Sphere", "Disc", "Rectangle"], [0,1,2,3,4])
-            distant_angle = SliderParm(hou.qt.InputField.FloatType, "    Distant Angle", (0.0,6000.0))
-            distance = SliderParm(hou.qt.InputField.FloatType, "Distance", (0.0,10000.0))
-            use_texture = CheckBox("Use Texture")
-            bake_texture = Button(f"Bake Light Texture")
-
-            # link widgets to parameters
-            separate_toggle.setParm(self.node.parm(f"separate{i+1}"))
-            renderable_toggle.setParm(self.node.parm(f"renderable{i+1}"))
-            fill_toggle.setParm(self.node.parm(f"fill{i+1}"))
-            color.setParm(self.node.parmTuple(f"clr{i+1}"))
-            exposure.setParm(self.node.parm(f"exposure{i+1}"))
-            light_name.setParm(self.node.parm(f"name{i+1}"))
-            lpe.setParm(self.node.parm(f"lpe{i+1}"))
-            light_type.setParm(self.node.parm(f"lighttype{i+1}"))
-            distant_angle.setParm(self.node.parm(f"dist_angle{i+1}"))
-            distance.setParm(self.node.parm(f"dist{i+1}"))
-            use_texture.setParm(self.node.parm(f"use_tex{i+1}"))
-            bake_texture.setParm(self.node.parm(f"bake{i+1}"))
-
-            separate_toggle.setToolTip(f"separate{i+1}\nSeparate Light from the HDR map")
-            renderable_toggle.setToolTip(f"renderable{i+1}\nMake Light renderable")
-            fill_toggle.setToolTip(f"fill{i+1}\nDelete highlight from the HDR map (Fill with nearest colors)")
-            color.setToolTip(f"clr{i+1}r, clr{i+1}g, clr{i+1}b\nLight Color multiplier")
-            exposure.setToolTip(f"exposure{i+1}\nLight Exposure")
-            light_name.setToolTip(f"name{i+1}\nLight Name")
-            lpe.setToolTip(f"lpe{i+1}\nLight LPE Tag")
-            light_type.setToolTip(f"lighttype{i+1}\nLight Type Definition\nTexture can be used only for Rectangle Light")
-            distant_angle.setToolTip(f"dist_angle{i+1}\nDistant Light Angle\n (size of shape meashured in degrees from the center of imaginary sphere)")
-            distance.setToolTip(f"dist{i+1}\nLight Distance from center. Usable for all instead distant light.\n When Light in distant mode it just move icon in 3d space but not change lighting")
-            use_texture.setToolTip(f"use_tex{i+1}\nUse Texture for Rectangle Light")
-            bake_texture.setToolTip(f"bale{i+1}\nBake current light Texture\nIf button color is green - texture is baked\nIf button color is red - texture need to bake")
-
-            # connect widgets to each other
-            separate_toggle.toggle.toggled.connect(self.hdrView.shapes[i].setSeparated)
-            separate_toggle.toggle.toggled.connect(self.parmsView.checkBakedFlag)
-            fill_toggle.toggle.toggled.connect(self.hdrView.shapes[i].setFilled)
-            fill_toggle.toggle.toggled.connect(self.parmsView.checkBakedFlag)
-            color.colorField.valueChanged.connect(self.parmsView.checkBakedFlag)
-            exposure._field.editingFinished.connect(self.parmsView.checkBakedFlag)
-            exposure._slider.valueChanged.connect(self.parmsView.checkBakedFlag)
-            bake_texture.button.clicked.connect(self.parmsView.checkBakedFlag)
-            shape.setSeparated(separate_toggle.getValue())
-
-            # set rules for widgets activation
-            #                         Sep   Type   UseTex
-            renderable_toggle.rule = [True, None,  None]
-            fill_toggle.rule =       [None, None,  None]
-            light_name.rule =        [True, None,  None]
-            lpe.rule =               [True, None,  None]
-            light_type.rule =        [True, None,  None]
-            distant_angle.rule =     [True, True,  None]
-            distance.rule =          [True, None,  None]
-            use_texture.rule =       [True, False, None]
-            bake_texture.rule =      [None, None,  None]
-
-            # activate widgets by rules. Not beautiful but works ))
-            def activateParms(checked, widgets, checks) :
-                for widget in widgets :
-                    tests = []
-                    for i, check in enumerate(checks) :
-                        if i == 1 :
-                            tests.append(check.currentIndex()==0 if check is not None else None)
-                        else :
-                            tests.append(check.isChecked() if check is not None else None)
-                    state = all([tests[i]==widget.rule[i] for i in range(len(tests)) if widget.rule[i] is not None])
-                    widget.setEnabled(state)
-            toggles = [ separate_toggle.toggle, light_type.field, use_texture.toggle ]
-            separate_toggle.toggle.toggled.connect(lambda checked, w=[renderable_toggle, light_name, lpe, light_type, distant_angle, distance, use_texture, bake_texture], check=toggles : activateParms(checked,w,check))
-            light_type.field.currentIndexChanged.connect(lambda checked, w=[distant_angle, distance, use_texture, bake_texture], check=toggles : activateParms(checked,w,check))
-            use_texture.toggle.toggled.connect(lambda checked, w=[bake_texture], check=toggles: activateParms(checked,w,check))
-            activateParms(separate_toggle.toggle.isChecked(), [renderable_toggle, light_name, lpe, light_type, distant_angle, distance, use_texture, bake_texture],toggles)
-
-            toggles_layout = QHBoxLayout()
-            toggles_layout.setSpacing(2)
-            toggles_layout.setContentsMargins(0, 0, 0, 0)
-            toggles_layout.addWidget(separate_toggle)
-            toggles_layout.addWidget(fill_toggle)
-            toggles_layout.addWidget(renderable_toggle)
-
-            name_layout = QHBoxLayout()
-            name_layout.setSpacing(2)
-            name_layout.setContentsMargins(0, 0, 0, 0)
-            name_layout.addWidget(light_name)
-            name_layout.addWidget(lpe)
-
-            type_layout = QHBoxLayout()
-            type_layout.setSpacing(2)
-            type_layout.setContentsMargins(0, 0, 0, 0)
-            type_layout.addWidget(light_type,2)
-            type_layout.addWidget(distant_angle,3)
-
-            tex_layout = QHBoxLayout()
-            tex_layout.setSpacing(2)
-            tex_layout.setContentsMargins(0, 0, 0, 0)
-            tex_layout.addWidget(use_texture,2)
-            tex_layout.addWidget(bake_texture,3)
-
-            layout = QVBoxLayout()
-            layout.setSpacing(2)
-            layout.setContentsMargins(2, 10, 2, 2)
-            layout.addLayout(toggles_layout)
-            layout.addWidget(color)
-            layout.addWidget(exposure)
-            layout.addLayout(name_layout)
-            layout.addLayout(type_layout)
-            layout.addWidget(distance)
-            layout.addLayout(tex_layout)
-            
-            self.tabs.append(QWidget())
-            self.seps.append(separate_toggle)
-            self.fills.append(fill_toggle)
-            self.buttons.append(bake_texture)
-            self.tabs[i].setLayout(layout)
-            self.tabs[i].setSizePolicy(QSizePolicy.Preferred, QSizePolicy.Preferred)
-            self.addTab(self.tabs[i], f"L {i+1}")
-            
-            # set color for tabs of separated lights
-            def sep_color(idx, checked) :
-                if checked :
-                    self.tabBar().setTabTextColor(idx+1, QColor.fromRgb(*Colors.tabSep))
-                else :
-                    self.tabBar().setTabTextColor(idx+1, QColor.fromRgb(*Colors.tabDef))
-            # connect color to toggle
-            self.seps[i].toggle.toggled.connect(lambda checked, index=i: sep_color(index, checked))
-            sep_color(i, self.seps[i].toggle.isChecked())
+        count = len(self.hdrView.shapes)
+        self.node.parm("lights").set(count)
+
+        if self.envTab is None :
+            self.buildEnvTab()
+        self.bindEnvTab()
+
+        while len(self.tabs) < count :
+            tab = LightTab(self)
+            self.tabs.append(tab)
+            self.addTab(tab, f"L {len(self.tabs)}")
+
+        self.lightsCount = count
+        stats = self.hdrView.shapeStats()
+        for i, tab in enumerate(self.tabs) :
+            if i < count :
+                tab.bind(self.node, i, stats)
+            self.setTabVisible(i+1, i < count)
+
+        self.seps = [tab.separate_toggle for tab in self.tabs[:count]]
+        self.fills = [tab.fill_toggle for tab in self.tabs[:count]]
+        self.buttons = [tab.bake_texture for tab in self.tabs[:count]]
+        if self.currentIndex() > count :
+            self.setCurrentIndex(0)
+        if self.lightTable is not None :
+            self.lightTable.lights.setLights(self.node, count, stats)
+        self.parmsView.sync.bind(self, self.boundWidgets())
         # check all baked flags
-        self.parmsView.checkBakedFlag()
+        self.parmsView.requestBakedFlag()
 
     def activateTab(self, index):
         self.setCurrentIndex(index)
 
     def onTabChange(self, index):
-        if len(self.tabs) != 0:
+        if self.lightsCount != 0:
             self.hdrView.selectShape(index-1)
 
+"""
+Table model of main parameters of all lights
+Parameters of the row are read from node only when view asks for it
+"""
+class LightTableModel(QAbstractTableModel) :
+    COLUMNS = ("Light", "Energy", "Separate", "Fill", "Color", "Exposure", "Type")
+    PARMS = {"Separate" : "separate", "Fill" : "fill", "Color" : "clr", "Exposure" : "exposure", "Type" : "lighttype"}
+    TYPES = ("Distant", "Point", "Sphere", "Disc", "Rectangle")
+
+    def __init__(self, parent=None) :
+        super().__init__(parent)
+        self.node = None
+        self.lightsCount = 0
+        self.stats = None
+        self.rows = {}
+        self.selectedRows = None
+
+    def setLights(self, node, count, stats) :
+        self.beginResetModel()
+        self.node = node
+        self.lightsCount = count
+        self.stats = stats
+        self.rows = {}
+        self.endResetModel()
+
+    # forget read values, visible rows are read again on repaint
+    def refresh(self) :
+        self.rows = {}
+        if self.lightsCount :
+            self.dataChanged.emit(self.index(0, 0), self.index(self.lightsCount-1, len(self.COLUMNS)-1))
+
+    def rowCount(self, parent=QModelIndex()) :
+        return 0 if parent.isValid() else self.lightsCount
+
+    def columnCount(self, parent=QModelIndex()) :
+        return 0 if parent.isValid() else len(self.COLUMNS)
+
+    def values(self, row) :
+        if row not in self.rows :
+            i = row + 1
+            self.rows[row] = (self.node.parm(f"name{i}").eval(),
+                              self.node.parm(f"separate{i}").eval(),
+                              self.node.parm(f"fill{i}").eval(),
+                              self.node.parmTuple(f"clr{i}").eval(),
+                              self.node.parm(f"exposure{i}").eval(),
+                              self.node.parm(f"lighttype{i}").eval())
+        return self.rows[row]
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole) :
+        if role != Qt.DisplayRole :
+            return None
+        if orientation == Qt.Horizontal :
+            return self.COLUMNS[section]
+        return f"L {section+1}"
+
+    def flags(self, index) :
+        flags = Qt.ItemIsEnabled | Qt.ItemIsSelectable
+        column = self.COLUMNS[index.column()]
+        if column in ("Separate", "Fill") :
+            flags |= Qt.ItemIsUserCheckable
+        elif column in ("Color", "Exposure", "Type") :
+            flags |= Qt.ItemIsEditable
+        return flags
+
+    # UserRole keeps raw values used for sorting
+    def data(self, index, role=Qt.DisplayRole) :
+        if not index.isValid() :
+            return None
+        row = index.row()
+        column = self.COLUMNS[index.column()]
+        name, separate, fill, color, exposure, light_type = self.values(row)
+        if column == "Light" :
+            values = {Qt.DisplayRole : name, Qt.UserRole : row}
+        elif column == "Energy" :
+            share = float(self.stats.share[row]) if self.stats is not None and row < len(self.stats.share) else 0.0
+            values = {Qt.DisplayRole : f"{share*100:.1f}%", Qt.UserRole : share}
+        elif column in ("Separate", "Fill") :
+            checked = separate if column == "Separate" else fill
+            values = {Qt.CheckStateRole : Qt.Checked if checked else Qt.Unchecked, Qt.UserRole : checked}
+        elif column == "Color" :
+            text = " ".join(f"{c:.3g}" for c in color)
+            swatch = QColor.fromRgbF(*[min(max(c, 0.0), 1.0) for c in color])
+            values = {Qt.DisplayRole : text, Qt.EditRole : text, Qt.DecorationRole : swatch, Qt.UserRole : sum(color) / 3.0}
+        elif column == "Exposure" :
+            values = {Qt.DisplayRole : f"{exposure:.3g}", Qt.EditRole : exposure, Qt.UserRole : exposure}
+        else :
+            values = {Qt.DisplayRole : self.TYPES[light_type], Qt.EditRole : light_type, Qt.UserRole : light_type}
+        return values.get(role)
+
+    # Edit of row from selection is applied to all selected rows.
+    # Parms are written in one undo group, so asset is cooked once after all of them
+    def setData(self, index, value, role=Qt.EditRole) :
+        column = self.COLUMNS[index.column()]
+        try :
+            if column in ("Separate", "Fill") and role == Qt.CheckStateRole :
+                value = int(int(value) == int(Qt.Checked))
+            elif column == "Color" and role == Qt.EditRole :
+                value = [float(c) for c in str(value).replace(",", " ").split()]
+                value = value * 3 if len(value) == 1 else value
+                if len(value) != 3 :
+                    return False
+            elif column == "Exposure" and role == Qt.EditRole :
+                value = float(value)
+            elif column == "Type" and role == Qt.EditRole :
+                value = int(value)
+            else :
+                return False
+        except ValueError :
+            return False
+
+        rows = self.selectedRows() if self.selectedRows is not None else []
+        if index.row() not in rows :
+            rows = [index.row()]
+        name = self.PARMS[column]
+        with hou.undos.group("Lighter Light Table") :
+            for row in rows :
+                parm = self.node.parmTuple(f"{name}{row+1}") if column == "Color" else self.node.parm(f"{name}{row+1}")
+                parm.set(value)
+                self.rows.pop(row, None)
+        for row in rows :
+            self.dataChanged.emit(self.index(row, 0), self.index(row, len(self.COLUMNS)-1))
+        return True
+
+"""
+Editors for light table cells
+"""
+class LightTableDelegate(QStyledItemDelegate) :
+    def createEditor(self, parent, option, index) :
+        column = LightTableModel.COLUMNS[index.column()]
+        if column == "Type" :
+            editor = QComboBox(parent)
+            editor.addItems(LightTableModel.TYPES)
+            return editor
+        editor = QLineEdit(parent)
+        if column == "Exposure" :
+            editor.setValidator(QDoubleValidator(editor))
+        return editor
+
+    def setEditorData(self, editor, index) :
+        value = index.data(Qt.EditRole)
+        if isinstance(editor, QComboBox) :
+            editor.setCurrentIndex(value)
+        else :
+            editor.setText(str(value))
+
+    def setModelData(self, editor, model, index) :
+        value = editor.currentIndex() if isinstance(editor, QComboBox) else editor.text()
+        model.setData(index, value, Qt.EditRole)
+
+"""
+Spreadsheet of all lights, alternative to light tabs for maps with many highlights
+Only visible rows are painted and read from node. Sorted by energy by default
+"""
+class LightTable(QTableView) :
+    def __init__(self, lightParms, parent=None) :
+        super().__init__(parent)
+        self.lightParms = lightParms
+        self.lights = LightTableModel(self)
+        self.lights.selectedRows = self.selectedRows
+        self.proxy = QSortFilterProxyModel(self)
+        self.proxy.setSourceModel(self.lights)
+        self.proxy.setSortRole(Qt.UserRole)
+
+        self.setModel(self.proxy)
+        self.setItemDelegate(LightTableDelegate(self))
+        self.setSortingEnabled(True)
+        self.sortByColumn(1, Qt.DescendingOrder)
+        self.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.setSelectionMode(QAbstractItemView.ExtendedSelection)
+        self.setEditTriggers(QAbstractItemView.DoubleClicked | QAbstractItemView.EditKeyPressed)
+        self.verticalHeader().setDefaultSectionSize(22)
+        self.horizontalHeader().setStretchLastSection(True)
+        self.setMinimumHeight(256)
+        self.setToolTip("All lights of the map, click header to sort\nEdit of selected row is applied to all selected rows\nColor is typed as r g b or single value")
+
+        self.selectionModel().currentRowChanged.connect(self.onRowChange)
+
+    # rows of source model, independent from sorting
+    def selectedRows(self) :
+        return sorted({self.proxy.mapToSource(index).row() for index in self.selectionModel().selectedRows()})
+
+    def onRowChange(self, current, previous) :
+        if current.isValid() :
+            self.lightParms.activateTab(self.proxy.mapToSource(current).row() + 1)
+
 """
 Main panel widget
 Have methods used in houdini lighter python pannel
@@ -1250,6 +2270,9 @@ class LighterPanel(QWidget) :
         self._HdrView.setMinimumHeight(256)
         self._HdrView.initView()
         self._LightsView.setHdrView(self._HdrView)
+        self._LightTable = LightTable(self._LightsView)
+        self._LightsView.setLightTable(self._LightTable)
+        self._ViewSettings = ViewSettings(self._HdrView)
         self._ParmsView = ParmsView(self._HdrView)
         self._HdrView.setLightsView(self._LightsView)
 
@@ -1263,11 +2286,30 @@ class LighterPanel(QWidget) :
         scroll_area.setWidget(scroll_widget)
         scroll_layout = QVBoxLayout()
         scroll_layout.addWidget(self._HdrView,1)
+        scroll_layout.addWidget(self._ViewSettings)
         scroll_layout.addWidget(self._ParmsView)
-        scroll_layout.addWidget(self._LightsView)
+        self._TableToggle = QPushButton("Light Table")
+        self._TableToggle.setCheckable(True)
+        self._TableToggle.setToolTip("Show all lights in one table instead of tabs")
+        self._TableToggle.toggled.connect(self.showLightTable)
+        toggle_layout = QHBoxLayout()
+        toggle_layout.setContentsMargins(2, 2, 2, 2)
+        toggle_layout.addStretch()
+        toggle_layout.addWidget(self._TableToggle)
+        self._LightsStack = QStackedWidget()
+        self._LightsStack.addWidget(self._LightsView)
+        self._LightsStack.addWidget(self._LightTable)
+        scroll_layout.addLayout(toggle_layout)
+        scroll_layout.addWidget(self._LightsStack)
         scroll_widget.setLayout(scroll_layout)
         self.setLayout(layout)
 
+    # switch between light tabs and light table
+    def showLightTable(self, checked) :
+        self._LightsStack.setCurrentIndex(1 if checked else 0)
+        if checked :
+            self._LightTable.lights.refresh()
+
     def onActivate(self, kwargs) :
         self._panel = kwargs["paneTab"]
 
@@ -1275,10 +2317,13 @@ class LighterPanel(QWidget) :
         self._panel = None
 
     def onDestroy(self) :
+        self._ParmsView.sync.setNode(None)
         del self._panel
         del self._asset
         del self._LightsView
+        del self._LightTable
         del self._HdrView
+        del self._ViewSettings
         del self._ParmsView
 
     def onNodePathChanged(self, node) :
@@ -0,0 +1,26 @@
+import sys, hou
+
+"""
+Background light texture baking for Lighter
+Runs in hython started by parallel mode of bake_all in the asset:
+hython lighter_bake.py <hda> <node file> <node name> <texpath> <savepath> <indices>
+Node is loaded from the snapshot saved by the interactive session,
+indices are comma separated light numbers (starting from 1).
+"""
+
+def bake(hda, items, name, texpath, savepath, indices) :
+    hou.hda.installFile(hda)
+    stage = hou.node("/stage")
+    stage.loadItemsFromFile(items)
+    node = stage.node(name)
+    # expanded paths of the session, $HIP and $VER differ here
+    node.parm("texpath").set(texpath)
+    node.parm("savepath").set(savepath)
+    for idx in indices :
+        node.parm("light_index").set(idx-1)
+        node.node("comp/bake_light").render()
+        print(f"baked light {idx}", flush=True)
+
+if __name__ == "__main__" :
+    hda, items, name, texpath, savepath, indices = sys.argv[1:7]
+    bake(hda, items, name, texpath, savepath, [int(idx) for idx in indices.split(",")])
@@ -0,0 +1,1157 @@
+import numpy, math, os, hashlib
+
+"""
+Headless highlight detection for Lighter
+Mirrors the comp network of the lighter asset:
+clip -> resample to detect res -> blur -> dilate/erode -> mono -> threshold
+Works only with numpy float32 arrays (rows from top to bottom, rgb in last axis),
+so it can be used without hou in farm scripts, tests and panel previews.
+With wrap enabled longitude is periodic: filters read across the left and right
+sides and highlights crossing the map edge become one region.
+"""
+
+# ntsc luminance weights (same as mono COP)
+LUMA = numpy.array((0.299, 0.587, 0.114), dtype=numpy.float32)
+
+# detect map resolution from "detectres" parameter (equirect is 2:1)
+def detect_res(detectres) :
+    return int(detectres), max(int(detectres) // 2, 1)
+
+# make float32 rgb image from mono, rgb or rgba array
+def as_rgb(image) :
+    image = numpy.asarray(image, dtype=numpy.float32)
+    if image.ndim == 2 :
+        image = image[:, :, None]
+    if image.shape[2] == 1 :
+        return numpy.repeat(image, 3, axis=2)
+    return image[:, :, :3]
+
+# soft roll-off above start, asymptotic to start + sup (pyro_utils.h softclip)
+def softclip(x, start, sup=1.0) :
+    over = numpy.maximum(x - start, 0.0)
+    return numpy.where(x > start, start + sup * (1.0 - numpy.exp(-over / sup)), x)
+
+# part of the image above clip value (clip, back and diff1 nodes)
+def clip_highlights(image, clip) :
+    value = image.max(axis=2)
+    clipped = softclip(value, clip)
+    scale = numpy.ones_like(value)
+    numpy.divide(clipped, value, out=scale, where=value > 0)
+    return (image * (1.0 - scale)[:, :, None]).astype(numpy.float32)
+
+# area (box) resampling along one axis through prefix sums
+def _resample_axis(image, size, axis) :
+    count = image.shape[axis]
+    if count == size :
+        return image
+    image = numpy.moveaxis(image, axis, 0)
+    if count % size == 0 :
+        result = image.reshape((size, count // size) + image.shape[1:]).mean(axis=1)
+    else :
+        csum = numpy.zeros((count + 1,) + image.shape[1:], dtype=numpy.float64)
+        numpy.cumsum(image, axis=0, out=csum[1:])
+        edges = numpy.linspace(0.0, count, size + 1)
+        idx = numpy.minimum(edges.astype(numpy.int64), count - 1)
+        frac = (edges - idx).reshape((-1,) + (1,) * (image.ndim - 1))
+        sums = csum[idx] + frac * (csum[idx + 1] - csum[idx])
+        widths = numpy.diff(edges).reshape((-1,) + (1,) * (image.ndim - 1))
+        result = (sums[1:] - sums[:-1]) / widths
+    return numpy.moveaxis(result.astype(numpy.float32), 0, axis)
+
+# resample image to width x height with box filter (resample COP)
+def resample(image, width, height) :
+    image = _resample_axis(image, height, 0)
+    return _resample_axis(image, width, 1)
+
+# blur size above which gaussian is approximated by box filters
+BOX_BLUR_SIZE = 8.0
+
+# normalized gaussian kernel, size is blur radius in pixels
+def gaussian_kernel(size) :
+    sigma = max(size / 3.0, 1e-6)
+    radius = max(int(math.ceil(size)), 0)
+    x = numpy.arange(-radius, radius + 1, dtype=numpy.float32)
+    kernel = numpy.exp(-0.5 * (x / sigma) ** 2)
+    return kernel / kernel.sum()
+
+# pad mode along axis: rows are clamped, columns are periodic for wrapped maps
+def _pad_mode(axis, wrap) :
+    return "wrap" if wrap and axis == 1 else "edge"
+
+# slice of size elements along axis starting at start
+def _window(image, start, size, axis) :
+    return image[(slice(None),) * axis + (slice(start, start + size),)]
+
+# 1d convolution along axis, pixels outside are taken from the nearest edge or other side
+def _convolve_axis(image, kernel, axis, wrap=False) :
+    radius = len(kernel) // 2
+    if radius == 0 :
+        return image
+    pad = [(0, 0)] * image.ndim
+    pad[axis] = (radius, radius)
+    padded = numpy.pad(image, pad, mode=_pad_mode(axis, wrap))
+    size = image.shape[axis]
+    result = numpy.zeros_like(image)
+    for i, weight in enumerate(kernel) :
+        result += weight * _window(padded, i, size, axis)
+    return result
+
+# radii of box filters which repeated one after another give gaussian with sigma
+def gaussian_boxes(sigma, passes=3) :
+    ideal = math.sqrt(12.0 * sigma * sigma / passes + 1.0)
+    lower = int(math.floor(ideal))
+    if lower % 2 == 0 :
+        lower -= 1
+    upper = lower + 2
+    count = int(round((12.0 * sigma * sigma - passes * lower * lower - 4 * passes * lower - 3 * passes) / (-4.0 * lower - 4)))
+    return [(lower if i < count else upper) // 2 for i in range(passes)]
+
+# box filter along axis from prefix sums, cost doesn't depend on radius
+# window can be wider than the image, it reads edge pixels or other side repeatedly
+def _box_axis(image, radius, axis, wrap=False) :
+    if radius <= 0 :
+        return image
+    work = numpy.moveaxis(image, axis, 0)
+    size = work.shape[0]
+    prefix = numpy.zeros((size + 1,) + work.shape[1:], dtype=numpy.float64)
+    numpy.cumsum(work, axis=0, dtype=numpy.float64, out=prefix[1:])
+    column = (-1,) + (1,) * (work.ndim - 1)
+    index = numpy.arange(size)
+    high, low = index + radius + 1, index - radius
+
+    # window sum is difference of prefix sums, parts outside the image are added to border rows only
+    if wrap :
+        result = prefix[high % size] - prefix[low % size]
+        turns = high // size - low // size
+        rows = numpy.nonzero(turns)[0]
+        result[rows] += turns[rows].reshape(column) * prefix[size]
+    else :
+        result = prefix[numpy.minimum(high, size)] - prefix[numpy.maximum(low, 0)]
+        rows = numpy.nonzero(low < 0)[0]
+        result[rows] -= low[rows].reshape(column) * work[0]
+        rows = numpy.nonzero(high > size)[0]
+        result[rows] += (high[rows] - size).reshape(column) * work[size - 1]
+    result *= 1.0 / (2 * radius + 1)
+    return numpy.moveaxis(result.astype(image.dtype), 0, axis)
+
+# gaussian blur approximated by three box filters, for large sizes where kernel is too long
+def box_blur(image, size, wrap=True) :
+    if size <= 0 :
+        return image
+    for radius in gaussian_boxes(size / 3.0) :
+        image = _box_axis(_box_axis(image, radius, 0), radius, 1, wrap)
+    return image
+
+# gaussian blur (blur1 and blur3 nodes)
+# small sizes use exact kernel, large ones run in time independent of size
+def blur(image, size, wrap=True) :
+    if size <= 0 :
+        return image
+    if size > BOX_BLUR_SIZE :
+        return box_blur(image, size, wrap)
+    kernel = gaussian_kernel(size)
+    return _convolve_axis(_convolve_axis(image, kernel, 0), kernel, 1, wrap)
+
+# running max or min with square window along axis
+def _rank_axis(image, radius, axis, func, wrap=False) :
+    pad = [(0, 0)] * image.ndim
+    pad[axis] = (radius, radius)
+    padded = numpy.pad(image, pad, mode=_pad_mode(axis, wrap))
+    size = image.shape[axis]
+    result = _window(padded, 0, size, axis).copy()
+    for i in range(1, 2 * radius + 1) :
+        func(result, _window(padded, i, size, axis), out=result)
+    return result
+
+def dilate(image, radius, wrap=True) :
+    if radius <= 0 :
+        return image
+    return _rank_axis(_rank_axis(image, radius, 0, numpy.maximum), radius, 1, numpy.maximum, wrap)
+
+def erode(image, radius, wrap=True) :
+    if radius <= 0 :
+        return image
+    return _rank_axis(_rank_axis(image, radius, 0, numpy.minimum), radius, 1, numpy.minimum, wrap)
+
+# dilate by size and then erode by size (dilate and erode nodes)
+# positive size glues near spots, negative removes small ones
+def dilate_erode(image, size, wrap=True) :
+    size = int(size)
+    if size > 0 :
+        return erode(dilate(image, size, wrap), size, wrap)
+    elif size < 0 :
+        return dilate(erode(image, -size, wrap), -size, wrap)
+    return image
+
+def luminance(image) :
+    return numpy.dot(image, LUMA)
+
+def threshold_mask(lum, threshold) :
+    return lum > threshold
+
+# luminance of highlights before threshold
+# wrap=False gives exactly the same result as the asset, which doesn't read across map sides
+def highlights(image, clip=1.0, blursize=3.0, size=2, detectres=512, wrap=True) :
+    width, height = detect_res(detectres)
+    image = clip_highlights(as_rgb(image), clip)
+    image = resample(image, width, height)
+    image = blur(image, blursize, wrap)
+    image = dilate_erode(image, size, wrap)
+    return luminance(image)
+
+# squared distance along rows to the lowest of parabolas f (Felzenszwalb and Huttenlocher),
+# lower envelope is built for all rows at once, every column is pushed once and popped at most once
+def _envelope_rows(f) :
+    count, size = f.shape
+    rows = numpy.arange(count)
+    columns = numpy.arange(size, dtype=numpy.float64)
+    height = f + columns ** 2
+    vertex = numpy.zeros((count, size), dtype=numpy.int64)
+    start = numpy.full((count, size + 1), -numpy.inf)
+    top = numpy.zeros(count, dtype=numpy.int64)
+    for q in range(1, size) :
+        while True :
+            v = vertex[rows, top]
+            cross = (height[:, q] - height[rows, v]) / (2.0 * (q - v))
+            pop = cross <= start[rows, top]
+            if not pop.any() :
+                break
+            top[pop] -= 1
+        top += 1
+        vertex[rows, top] = q
+        start[rows, top] = cross
+
+    # parabola under every column is the number of envelope starts left of it,
+    # starts behind the top are left from popped parabolas
+    bounds = numpy.clip(start[:, 1:size + 1], -1.0, size + 1.0)
+    bounds[numpy.arange(1, size + 1)[None, :] > top[:, None]] = size + 1.0
+    bounds += (rows * (size + 3.0))[:, None]
+    points = columns[None, :] + (rows * (size + 3.0))[:, None]
+    index = numpy.searchsorted(bounds.ravel(), points.ravel()).reshape(count, size) - (rows * size)[:, None]
+    nearest = vertex[rows[:, None], index]
+    return (columns[None, :] - nearest) ** 2 + f[rows[:, None], nearest]
+
+# euclidean distance in pixels from every pixel to the nearest True pixel of mask
+# limit is the largest distance needed, wrapped maps are padded only by that much
+def distance_transform(mask, wrap=True, limit=None) :
+    mask = numpy.asarray(mask, dtype=bool)
+    height, width = mask.shape
+    far = float((height + width) ** 2)
+    if not mask.any() :
+        return numpy.full(mask.shape, numpy.sqrt(far), dtype=numpy.float32)
+
+    # vertical distance to the nearest pixel in the same column, from the last one above and the first one below
+    index = numpy.arange(height)[:, None]
+    outside = height + width
+    above = numpy.maximum.accumulate(numpy.where(mask, index, -outside), axis=0)
+    below = numpy.minimum.accumulate(numpy.where(mask, index, height + outside)[::-1], axis=0)[::-1]
+    column = numpy.minimum(index - above, below - index).astype(numpy.float64)
+    f = numpy.minimum(column ** 2, far)
+
+    pad = 0
+    if wrap :
+        pad = width // 2 if limit is None else min(int(math.ceil(limit)) + 1, width // 2)
+        f = numpy.pad(f, ((0, 0), (pad, pad)), mode="wrap")
+    squared = _envelope_rows(f)[:, pad:pad + width]
+    return numpy.sqrt(squared).astype(numpy.float32)
+
+# closing (radius > 0) or opening (radius < 0) of mask with a disk of radius in pixels
+# made with two distance transforms, so cost doesn't grow with radius
+def glue(mask, radius, wrap=True) :
+    mask = numpy.asarray(mask, dtype=bool)
+    if radius == 0 :
+        return mask
+    limit = abs(radius) + 1
+    if radius > 0 :
+        grown = distance_transform(mask, wrap, limit) <= radius
+        return distance_transform(~grown, wrap, limit) > radius
+    shrunk = distance_transform(~mask, wrap, limit) > -radius
+    return distance_transform(shrunk, wrap, limit) <= -radius
+
+# glue distance in degrees to pixels of detect map, the same angle for every detect res
+def glue_radius(degrees, detectres) :
+    width, height = detect_res(detectres)
+    return degrees * width / 360.0
+
+# full detection chain, returns boolean mask of highlights in detect resolution
+# glue is distance in degrees to join spots with (negative to remove smaller ones) instead of size
+def detect(image, clip=1.0, blursize=3.0, size=2, threshold=0.5, detectres=512, wrap=True, glue_degrees=None) :
+    if glue_degrees is None :
+        lum = highlights(image, clip, blursize, size, detectres, wrap)
+        return threshold_mask(lum, threshold)
+    lum = highlights(image, clip, blursize, 0, detectres, wrap)
+    return glue(threshold_mask(lum, threshold), glue_radius(glue_degrees, detectres), wrap)
+
+# solid angle weight of every row of equirect map, proportional to cos of latitude
+def row_weights(height) :
+    latitude = (0.5 - (numpy.arange(height) + 0.5) / height) * math.pi
+    return numpy.cos(latitude)
+
+# split of weighted histogram with the biggest variance between classes (Otsu)
+# variance is the same for every split in empty bins between two classes, the middle one is taken
+def otsu(counts, centers) :
+    weight = numpy.cumsum(counts)
+    mean = numpy.cumsum(counts * centers)
+    total, total_mean = weight[-1], mean[-1]
+    low = weight[:-1]
+    high = total - low
+    valid = (low > 0) & (high > 0)
+    variance = numpy.zeros(len(low))
+    variance[valid] = (total_mean * low[valid] / total - mean[:-1][valid]) ** 2 * total / (low[valid] * high[valid])
+    ties = numpy.nonzero(variance == variance.max())[0]
+    return int(ties[0] + ties[-1]) // 2 + 1
+
+# hard range of "threshold" parameter of the asset
+THRESHOLD_RANGE = (0.001, 1.0)
+
+# clip and threshold proposed from histograms of log2 values weighted by solid angle.
+# Clip is Otsu split of light (pixels times value) in histogram of value (max of rgb, as clip reads it),
+# it separates small bright highlights from the rest of the map.
+# Threshold is Otsu split of highlights luminance (clipped, blurred and dilated/eroded like the asset)
+# between dim tails of blur and the highlights. Luminance out of THRESHOLD_RANGE is counted
+# in its first or last bin, so the split is always inside the range.
+def auto_params(image, detectres=512, blursize=3.0, size=2, wrap=True, bins=256) :
+    width, height = detect_res(detectres)
+    value = resample(as_rgb(image), width, height).max(axis=2)
+    weights = numpy.broadcast_to(row_weights(height)[:, None], value.shape)
+    lit = value > 0
+    if not lit.any() :
+        return 1.0, 0.5
+    stops = numpy.log2(value[lit])
+    counts, edges = numpy.histogram(stops, bins=bins, weights=weights[lit])
+    if edges[-1] - edges[0] < 1e-6 :
+        return max(float(2.0 ** edges[0]), 1.0), 0.5
+    centers = 2.0 ** (0.5 * (edges[:-1] + edges[1:]))
+    clip = max(float(2.0 ** edges[otsu(counts * centers, numpy.log2(centers))]), 1.0)
+
+    lum = highlights(image, clip, blursize, size, detectres, wrap)
+    lit = lum > 0
+    if not lit.any() :
+        return clip, 0.5
+    limits = numpy.log2(THRESHOLD_RANGE)
+    stops = numpy.clip(numpy.log2(lum[lit]), limits[0], limits[1])
+    counts, edges = numpy.histogram(stops, bins=bins, range=tuple(limits), weights=weights[lit])
+    centers = 0.5 * (edges[:-1] + edges[1:])
+    return clip, float(2.0 ** edges[otsu(counts, centers)])
+
+"""
+Connected regions of highlights mask
+labels - label image, 0 is background, regions are numbered from 1 in raster order
+sizes - pixel count of every region
+bboxes - xmin, ymin, xmax, ymax of every region (inclusive)
+centroids - x, y center of every region in pixels
+wrapped - regions crossing the map edge. Their pixels left of the map center
+are counted as pixels right of the map edge, so xmax of bbox can be bigger than width
+"""
+class Regions :
+    def __init__(self, labels, sizes, bboxes, centroids, wrapped=None) :
+        self.labels = labels
+        self.sizes = sizes
+        self.bboxes = bboxes
+        self.centroids = centroids
+        self.wrapped = wrapped if wrapped is not None else numpy.zeros(len(sizes), dtype=bool)
+
+    def __len__(self) :
+        return len(self.sizes)
+
+# horizontal runs of mask as row, start and end (exclusive) arrays in raster order
+def _runs(mask) :
+    height, width = mask.shape
+    padded = numpy.zeros((height, width + 2), dtype=numpy.int8)
+    padded[:, 1:-1] = mask
+    edges = numpy.diff(padded, axis=1)
+    rows, starts = numpy.nonzero(edges == 1)
+    ends = numpy.nonzero(edges == -1)[1]
+    return rows, starts, ends
+
+# pairs of touching runs from neighbouring rows
+def _run_pairs(rows, starts, ends, width, connectivity) :
+    k = 1 if connectivity == 8 else 0
+    stride = width + 2
+    start_keys = rows * stride + starts
+    end_keys = rows * stride + ends
+    prev_row = (rows - 1) * stride
+    lo = numpy.searchsorted(end_keys, prev_row + starts - k, side="right")
+    hi = numpy.searchsorted(start_keys, prev_row + ends + k, side="left")
+    counts = numpy.maximum(hi - lo, 0)
+    second = numpy.repeat(numpy.arange(len(rows)), counts)
+    offsets = numpy.repeat(numpy.cumsum(counts) - counts, counts)
+    first = numpy.repeat(lo, counts) + numpy.arange(counts.sum()) - offsets
+    return first, second
+
+# pairs of runs touching each other through left and right map sides
+def _seam_pairs(rows, starts, ends, height, width, connectivity) :
+    left = numpy.full(height, -1)
+    right = numpy.full(height, -1)
+    first = numpy.nonzero(starts == 0)[0]
+    last = numpy.nonzero(ends == width)[0]
+    left[rows[first]] = first
+    right[rows[last]] = last
+    shifts = (-1, 0, 1) if connectivity == 8 else (0,)
+    pairs_a = []
+    pairs_b = []
+    for shift in shifts :
+        lo, hi = max(0, -shift), min(height, height - shift)
+        a = left[lo:hi]
+        b = right[lo + shift:hi + shift]
+        valid = (a >= 0) & (b >= 0)
+        pairs_a.append(a[valid])
+        pairs_b.append(b[valid])
+    return numpy.concatenate(pairs_a), numpy.concatenate(pairs_b)
+
+# array backed union-find: hook bigger root to smaller one and compress paths until pairs share roots
+def _union_find(count, first, second) :
+    parent = numpy.arange(count)
+    while len(first) :
+        a, b = parent[first], parent[second]
+        diff = a != b
+        if not diff.any() :
+            break
+        a, b = a[diff], b[diff]
+        numpy.minimum.at(parent, numpy.maximum(a, b), numpy.minimum(a, b))
+        while True :
+            grand = parent[parent]
+            if numpy.array_equal(grand, parent) :
+                break
+            parent = grand
+        first, second = first[diff], second[diff]
+    return parent
+
+# label connected regions of boolean mask, connectivity is 4 or 8
+# with wrap regions are connected through left and right sides of the map
+def label(mask, connectivity=8, wrap=True) :
+    mask = numpy.asarray(mask, dtype=bool)
+    height, width = mask.shape
+    rows, starts, ends = _runs(mask)
+    first, second = _run_pairs(rows, starts, ends, width, connectivity)
+    if wrap :
+        seam_a, seam_b = _seam_pairs(rows, starts, ends, height, width, connectivity)
+        first = numpy.concatenate((first, seam_a))
+        second = numpy.concatenate((second, seam_b))
+    roots = _union_find(len(rows), first, second)
+    ids, run_labels = numpy.unique(roots, return_inverse=True)
+    count = len(ids)
+    run_labels = run_labels.reshape(-1)
+    wrapped = numpy.zeros(count, dtype=bool)
+    if wrap :
+        wrapped[run_labels[seam_a]] = True
+
+    # paint runs into label image
+    marks = numpy.zeros((height, width + 1), dtype=numpy.int32)
+    marks[rows, starts] = run_labels + 1
+    marks[rows, ends] -= run_labels + 1
+    labels = numpy.cumsum(marks, axis=1)[:, :width].astype(numpy.int32)
+
+    sizes, bboxes, centroids = _run_stats(rows, starts, ends, run_labels, count, wrapped, width)
+    return Regions(labels, sizes, bboxes, centroids, wrapped)
+
+# region statistics from runs, left half of wrapped regions is moved behind the right side
+def _run_stats(rows, starts, ends, run_labels, count, wrapped, width) :
+    shift = wrapped[run_labels] & (starts + ends < width)
+    starts = starts + shift * width
+    ends = ends + shift * width
+    lengths = ends - starts
+    sizes = numpy.bincount(run_labels, weights=lengths, minlength=count).astype(numpy.int64)
+    bboxes = numpy.empty((count, 4), dtype=numpy.int64)
+    bboxes[:, :2] = numpy.iinfo(numpy.int64).max
+    bboxes[:, 2:] = -1
+    numpy.minimum.at(bboxes[:, 0], run_labels, starts)
+    numpy.minimum.at(bboxes[:, 1], run_labels, rows)
+    numpy.maximum.at(bboxes[:, 2], run_labels, ends - 1)
+    numpy.maximum.at(bboxes[:, 3], run_labels, rows)
+    centroids = numpy.zeros((count, 2), dtype=numpy.float64)
+    if count :
+        xsum = numpy.bincount(run_labels, weights=lengths * (starts + ends - 1) / 2.0, minlength=count)
+        ysum = numpy.bincount(run_labels, weights=lengths * rows, minlength=count)
+        centroids[:, 0] = (xsum / sizes) % width
+        centroids[:, 1] = ysum / sizes
+    return sizes, bboxes, centroids
+
+# label image of polygons given as (n, 2) arrays of x, y in pixels, later polygons are drawn over earlier
+# pixel is inside if its center is inside (even-odd rule), spans of all rows are filled at once
+def rasterize(polygons, width, height) :
+    labels = numpy.zeros((height, width), dtype=numpy.int32)
+    for i, polygon in enumerate(polygons) :
+        polygon = numpy.asarray(polygon, dtype=numpy.float64)
+        if len(polygon) < 3 :
+            continue
+        x0, y0 = polygon[:, 0], polygon[:, 1]
+        x1, y1 = numpy.roll(x0, -1), numpy.roll(y0, -1)
+        top = max(int(math.floor(y0.min())), 0)
+        bottom = min(int(math.ceil(y0.max())), height)
+        if top >= bottom :
+            continue
+        centers = numpy.arange(top, bottom)[:, None] + 0.5
+        crossing = (y0 <= centers) != (y1 <= centers)
+        with numpy.errstate(divide="ignore", invalid="ignore") :
+            xs = x0 + (centers - y0) * (x1 - x0) / (y1 - y0)
+        xs = numpy.sort(numpy.where(crossing, xs, numpy.inf), axis=1)
+        starts, ends = xs[:, 0::2], xs[:, 1::2][:, :xs[:, 0::2].shape[1]]
+        rows = numpy.nonzero(numpy.isfinite(ends))
+        starts = numpy.clip(numpy.ceil(starts[rows] - 0.5), 0, width).astype(numpy.int64)
+        ends = numpy.clip(numpy.ceil(ends[rows] - 0.5), 0, width).astype(numpy.int64)
+        steps = numpy.zeros((bottom - top, width + 1), dtype=numpy.int32)
+        numpy.add.at(steps, (rows[0], starts), 1)
+        numpy.add.at(steps, (rows[0], ends), -1)
+        inside = numpy.cumsum(steps[:, :width], axis=1) > 0
+        labels[top:bottom][inside] = i + 1
+    return labels
+
+"""
+Light of every region of equirect map
+energy - radiance (luminance) integrated over solid angle of the region
+color - mean rgb of the region weighted by solid angle
+peak - the brightest luminance in the region
+solid_angle - solid angle of the region in steradians
+share - part of the energy of the whole map
+"""
+class Stats :
+    def __init__(self, energy, color, peak, solid_angle, share) :
+        self.energy = energy
+        self.color = color
+        self.peak = peak
+        self.solid_angle = solid_angle
+        self.share = share
+
+    def __len__(self) :
+        return len(self.energy)
+
+# stats of count regions from label image, labels can have other resolution than image
+def region_stats(image, labels, count) :
+    image = as_rgb(image)
+    height, width = image.shape[:2]
+    if labels.shape != (height, width) :
+        rows = numpy.arange(height) * labels.shape[0] // height
+        columns = numpy.arange(width) * labels.shape[1] // width
+        labels = labels[rows[:, None], columns[None, :]]
+    flat = labels.reshape(-1)
+
+    # solid angle of pixels in every row
+    pixel = (2.0 * math.pi / width) * (math.pi / height) * row_weights(height)
+    weights = numpy.broadcast_to(pixel[:, None], (height, width)).reshape(-1)
+    rgb = image.reshape(-1, 3)
+    lum = numpy.dot(rgb, LUMA)
+
+    solid_angle = numpy.bincount(flat, weights, count + 1)
+    energy = numpy.bincount(flat, lum * weights, count + 1)
+    color = numpy.stack([numpy.bincount(flat, rgb[:, c] * weights, count + 1) for c in range(3)], axis=1)
+    peak = numpy.zeros(count + 1)
+    inside = flat > 0
+    numpy.maximum.at(peak, flat[inside], lum[inside])
+
+    total = energy.sum()
+    with numpy.errstate(divide="ignore", invalid="ignore") :
+        color = numpy.where(solid_angle[:, None] > 0, color / solid_angle[:, None], 0.0)
+    share = energy / total if total > 0 else numpy.zeros(count + 1)
+    return Stats(energy[1:], color[1:], peak[1:], solid_angle[1:], share[1:])
+
+# unit vectors of points (x, y in pixels) of equirect map with given size
+def sphere_directions(points, width, height) :
+    points = numpy.asarray(points, dtype=numpy.float64).reshape(-1, 2)
+    longitude = 2.0 * math.pi * (points[:, 0] / width - 0.5)
+    latitude = math.pi * (0.5 - points[:, 1] / height)
+    return numpy.stack((numpy.cos(latitude) * numpy.cos(longitude),
+                        numpy.cos(latitude) * numpy.sin(longitude),
+                        numpy.sin(latitude)), axis=1)
+
+# index of old direction for every new one (-1 if none), closest pairs are matched first.
+# Pairs farther than max_angle degrees are not matched
+def match_directions(old, new, max_angle=10.0) :
+    match = numpy.full(len(new), -1, dtype=numpy.int64)
+    if len(old) == 0 or len(new) == 0 :
+        return match
+    similarity = numpy.dot(new, numpy.transpose(old))
+    limit = math.cos(math.radians(max_angle))
+    for _ in range(min(len(old), len(new))) :
+        j, i = numpy.unravel_index(numpy.argmax(similarity), similarity.shape)
+        if similarity[j, i] < limit :
+            break
+        match[j] = i
+        similarity[j, :] = -2.0
+        similarity[:, i] = -2.0
+    return match
+
+"""
+Outer contours of labeled regions packed into flat arrays
+points - x, y vertices of all polygons in pixels
+offsets - polygon of region i is points[offsets[i]:offsets[i+1]]
+Polygons of wrapped regions are continuous, so part of them lies
+outside of the map, with the polygon center inside of it.
+Wrapped regions wider than half of the map can still be split.
+"""
+class Contours :
+    def __init__(self, points, offsets) :
+        self.points = points
+        self.offsets = offsets
+
+    def __len__(self) :
+        return len(self.offsets) - 1
+
+    def polygon(self, index) :
+        return self.points[self.offsets[index]:self.offsets[index+1]]
+
+# oriented segments of marching squares cases as (from, to) cell edges
+# edges: 0 top, 1 right, 2 bottom, 3 left. Corners bits: tl 8, tr 4, br 2, bl 1
+# saddles 5 and 10 connect diagonal pixels, same as 8-connected labeling
+_SEGMENTS = { 1 : ((2, 3),),
+              2 : ((1, 2),),
+              3 : ((1, 3),),
+              4 : ((0, 1),),
+              5 : ((0, 3), (2, 1)),
+              6 : ((0, 2),),
+              7 : ((0, 3),),
+              8 : ((3, 0),),
+              9 : ((2, 0),),
+              10 : ((1, 0), (3, 2)),
+              11 : ((1, 0),),
+              12 : ((3, 1),),
+              13 : ((2, 1),),
+              14 : ((3, 2),) }
+
+# closed loops of successor permutation: loop id (smallest node) of every node
+# and order of nodes grouped by loops, both by pointer doubling
+def _cycle_order(nxt) :
+    count = len(nxt)
+    # smallest node of every cycle by pointer doubling
+    rep = numpy.arange(count)
+    jump = nxt.copy()
+    steps = 1
+    while steps < count :
+        rep = numpy.minimum(rep, rep[jump])
+        jump = jump[jump]
+        steps *= 2
+    # distance to the end of cycle opened before its smallest node
+    last = nxt == rep
+    dist = numpy.where(last, 0, 1)
+    ptr = numpy.where(last, numpy.arange(count), nxt)
+    steps = 1
+    while steps < count :
+        dist = dist + dist[ptr]
+        ptr = ptr[ptr]
+        steps *= 2
+    order = numpy.lexsort((-dist, rep))
+    return rep, order
+
+# remove vertices lying on straight line between neighbours
+def _simplify(points, offsets) :
+    count = len(points)
+    if count == 0 :
+        return points, offsets
+    sizes = numpy.diff(offsets)
+    starts = numpy.repeat(offsets[:-1], sizes)
+    ends = numpy.repeat(offsets[1:], sizes)
+    idx = numpy.arange(count)
+    prev = numpy.where(idx == starts, ends - 1, idx - 1)
+    nxt = numpy.where(idx == ends - 1, starts, idx + 1)
+    a = points - points[prev]
+    b = points[nxt] - points
+    cross = a[:, 0] * b[:, 1] - a[:, 1] * b[:, 0]
+    keep = numpy.abs(cross) > 1e-6
+    polys = numpy.repeat(numpy.arange(len(sizes)), sizes)
+    new_sizes = numpy.bincount(polys[keep], minlength=len(sizes))
+    new_offsets = numpy.zeros(len(sizes) + 1, dtype=numpy.int64)
+    numpy.cumsum(new_sizes, out=new_offsets[1:])
+    return points[keep], new_offsets
+
+# marching squares outlines of labeled regions
+# with field and level edges are interpolated, otherwise they lie between pixel centers
+def contours(regions, field=None, level=0.5) :
+    count = len(regions)
+    wrapped = regions.wrapped
+    if not wrapped.any() :
+        points, offsets = _outlines(regions.labels, count, field, level)
+        return Contours(points, offsets)
+
+    # wrapped regions are traced on map rolled by half of width, where they are not split
+    labels = regions.labels
+    width = labels.shape[1]
+    shift = width // 2
+    cross = wrapped[labels - 1] & (labels > 0)
+    points_a, offsets_a = _outlines(numpy.where(cross, 0, labels), count, field, level)
+    rolled = numpy.roll(numpy.where(cross, labels, 0), shift, axis=1)
+    rolled_field = numpy.roll(field, shift, axis=1) if field is not None else None
+    points_b, offsets_b = _outlines(rolled, count, rolled_field, level)
+    points_b[:, 0] -= shift
+
+    sizes_a = numpy.diff(offsets_a)
+    sizes_b = numpy.diff(offsets_b)
+    region_a = numpy.repeat(numpy.arange(count), sizes_a)
+    region_b = numpy.repeat(numpy.arange(count), sizes_b)
+    # move polygons with center behind the left side to the other side
+    centers = numpy.bincount(region_b, weights=points_b[:, 0], minlength=count) / numpy.maximum(sizes_b, 1)
+    points_b[:, 0] += numpy.where(centers < 0, width, 0)[region_b]
+
+    keep_a = ~wrapped[region_a]
+    keep_b = wrapped[region_b]
+    points = numpy.concatenate((points_a[keep_a], points_b[keep_b]))
+    region = numpy.concatenate((region_a[keep_a], region_b[keep_b]))
+    order = numpy.argsort(region, kind="stable")
+    sizes = numpy.where(wrapped, sizes_b, sizes_a)
+    offsets = numpy.zeros(count + 1, dtype=numpy.int64)
+    numpy.cumsum(sizes, out=offsets[1:])
+    return Contours(points[order], offsets)
+
+# flat outlines of all regions of label image, regions without pixels get empty polygons
+def _outlines(labels, count, field, level) :
+    height, width = labels.shape
+    padded = numpy.zeros((height + 2, width + 2), dtype=numpy.int32)
+    padded[1:-1, 1:-1] = labels
+    inside = padded > 0
+    values = numpy.full(padded.shape, numpy.nan, dtype=numpy.float32)
+    if field is not None :
+        values[1:-1, 1:-1] = field
+
+    tl = inside[:-1, :-1]
+    tr = inside[:-1, 1:]
+    br = inside[1:, 1:]
+    bl = inside[1:, :-1]
+    cases = tl * 8 + tr * 4 + br * 2 + bl * 1
+
+    # edge ids: horizontal edge (y, x) joins pixels (y, x) and (y, x+1),
+    # vertical edge (y, x) joins pixels (y, x) and (y+1, x) of padded image
+    hcount = (height + 2) * (width + 1)
+    def edge_id(ys, xs, edge) :
+        if edge == 0 :
+            return ys * (width + 1) + xs
+        if edge == 2 :
+            return (ys + 1) * (width + 1) + xs
+        if edge == 3 :
+            return hcount + ys * (width + 2) + xs
+        return hcount + ys * (width + 2) + xs + 1
+
+    sources = []
+    targets = []
+    for case, segments in _SEGMENTS.items() :
+        ys, xs = numpy.nonzero(cases == case)
+        for source, target in segments :
+            sources.append(edge_id(ys, xs, source))
+            targets.append(edge_id(ys, xs, target))
+    sources = numpy.concatenate(sources)
+    targets = numpy.concatenate(targets)
+    if len(sources) == 0 :
+        return numpy.zeros((0, 2), dtype=numpy.float32), numpy.zeros(count + 1, dtype=numpy.int64)
+    sort = numpy.argsort(sources)
+    sources = sources[sort]
+    nxt = numpy.searchsorted(sources, targets[sort])
+
+    # vertex positions and region of every edge
+    horizontal = sources < hcount
+    hy, hx = numpy.divmod(sources, width + 1)
+    vy, vx = numpy.divmod(sources - hcount, width + 2)
+    y0 = numpy.where(horizontal, hy, vy)
+    x0 = numpy.where(horizontal, hx, vx)
+    y1 = numpy.where(horizontal, y0, y0 + 1)
+    x1 = numpy.where(horizontal, x0 + 1, x0)
+    v0 = values[y0, x0]
+    v1 = values[y1, x1]
+    with numpy.errstate(invalid="ignore", divide="ignore") :
+        t = (level - v0) / (v1 - v0)
+    t = numpy.where(numpy.isfinite(t), numpy.clip(t, 0.0, 1.0), 0.5)
+    # padded pixel (y, x) has center at (x - 0.5, y - 0.5) of original image
+    xs = x0 + t * (x1 - x0) - 0.5
+    ys = y0 + t * (y1 - y0) - 0.5
+    region = padded[y0, x0] + padded[y1, x1] - 1
+
+    # split edges into closed loops and keep the biggest outer loop of every region
+    # (outer loops go counterclockwise on screen and have negative area)
+    rep, order = _cycle_order(nxt)
+    loops, loop_idx = numpy.unique(rep, return_inverse=True)
+    loop_idx = loop_idx.reshape(-1)
+    area = numpy.bincount(loop_idx, weights=xs * ys[nxt] - xs[nxt] * ys, minlength=len(loops))
+    loop_region = region[loops]
+    best = numpy.full(count, -1, dtype=numpy.int64)
+    by_area = numpy.lexsort((-area, loop_region))
+    best[loop_region[by_area]] = by_area
+
+    selected = numpy.zeros(len(loops), dtype=bool)
+    selected[best[best >= 0]] = True
+    order = order[selected[loop_idx[order]]]
+    order = order[numpy.argsort(loop_region[loop_idx[order]], kind="stable")]
+    sizes = numpy.bincount(region[order], minlength=count)
+    offsets = numpy.zeros(count + 1, dtype=numpy.int64)
+    numpy.cumsum(sizes, out=offsets[1:])
+    points = numpy.stack((xs[order], ys[order]), axis=1).astype(numpy.float32)
+    return _simplify(points, offsets)
+
+"""
+Highlights refined in native resolution of the map
+coarse - Regions found in the detect map
+tiles - x, y of top left corner and boolean mask of every region in native pixels.
+x of wrapped regions can be negative or bigger than width of the map
+sizes, bboxes, centroids - same as in Regions, but in native pixels
+contours - Contours of regions in native pixels
+"""
+class Refined :
+    def __init__(self, coarse, tiles, sizes, bboxes, centroids, contours) :
+        self.coarse = coarse
+        self.tiles = tiles
+        self.sizes = sizes
+        self.bboxes = bboxes
+        self.centroids = centroids
+        self.contours = contours
+
+    def __len__(self) :
+        return len(self.sizes)
+
+# refine coarse regions in native resolution. Detection runs only inside
+# bounding boxes of regions grown by filters radius, blursize and size are scaled
+# from detect map pixels to native pixels
+def refine(image, coarse, clip=1.0, blursize=3.0, size=2, threshold=0.5, wrap=True) :
+    image = as_rgb(image)
+    height, width = image.shape[:2]
+    coarse_height, coarse_width = coarse.labels.shape
+    scale_x = width / float(coarse_width)
+    scale_y = height / float(coarse_height)
+    fine_blur = blursize * scale_x
+    fine_size = int(round(size * scale_x))
+    halo = int(math.ceil(fine_blur)) + 2 * abs(fine_size) + 1
+    margin = int(math.ceil(blursize)) + abs(int(size)) + 1
+
+    tiles = []
+    sizes = numpy.zeros(len(coarse), dtype=numpy.int64)
+    bboxes = numpy.zeros((len(coarse), 4), dtype=numpy.int64)
+    centroids = numpy.zeros((len(coarse), 2), dtype=numpy.float64)
+    polygons = []
+    for i in range(len(coarse)) :
+        xmin, ymin, xmax, ymax = coarse.bboxes[i]
+        x0 = int(math.floor((xmin - margin) * scale_x))
+        x1 = int(math.ceil((xmax + 1 + margin) * scale_x))
+        y0 = max(int(math.floor((ymin - margin) * scale_y)), 0)
+        y1 = min(int(math.ceil((ymax + 1 + margin) * scale_y)), height)
+        if not wrap :
+            x0, x1 = max(x0, 0), min(x1, width)
+        x1 = min(x1, x0 + width)
+
+        # tile with halo, columns are read across map sides for wrapped maps
+        hy0, hy1 = max(y0 - halo, 0), min(y1 + halo, height)
+        hx0, hx1 = x0 - halo, x1 + halo
+        if not wrap :
+            hx0, hx1 = max(hx0, 0), min(hx1, width)
+        cols = numpy.arange(hx0, hx1) % width
+        tile = clip_highlights(image[hy0:hy1][:, cols], clip)
+        tile = blur(tile, fine_blur, wrap=False)
+        tile = dilate_erode(tile, fine_size, wrap=False)
+        lum = luminance(tile)[y0-hy0:y1-hy0, x0-hx0:x1-hx0]
+        mask = threshold_mask(lum, threshold)
+
+        # keep fine components touching the coarse region
+        parts = label(mask, wrap=False)
+        rows = numpy.minimum(((numpy.arange(y0, y1) + 0.5) / scale_y).astype(numpy.int64), coarse_height - 1)
+        cols = numpy.minimum((((numpy.arange(x0, x1) % width) + 0.5) / scale_x).astype(numpy.int64), coarse_width - 1)
+        inside = coarse.labels[rows][:, cols] == i + 1
+        keep = numpy.zeros(len(parts) + 1, dtype=bool)
+        keep[numpy.unique(parts.labels[inside & mask])] = True
+        keep[0] = False
+        mask = keep[parts.labels]
+
+        ys, xs = numpy.nonzero(mask)
+        tiles.append((x0, y0, mask))
+        sizes[i] = len(xs)
+        if len(xs) :
+            bboxes[i] = (x0 + xs.min(), y0 + ys.min(), x0 + xs.max(), y0 + ys.max())
+            centroids[i] = ((x0 + xs.mean()) % width, y0 + ys.mean())
+        points, _ = _outlines(mask.astype(numpy.int32), 1, lum, threshold)
+        polygons.append(points + numpy.array((x0, y0), dtype=numpy.float32))
+
+    offsets = numpy.zeros(len(coarse) + 1, dtype=numpy.int64)
+    numpy.cumsum([len(p) for p in polygons], out=offsets[1:])
+    points = numpy.concatenate(polygons) if polygons else numpy.zeros((0, 2), dtype=numpy.float32)
+    return Refined(coarse, tiles, sizes, bboxes, centroids, Contours(points, offsets))
+
+# coarse to fine detection: regions are found in detect map and refined in native resolution
+def detect_refined(image, clip=1.0, blursize=3.0, size=2, threshold=0.5, detectres=512, wrap=True) :
+    image = as_rgb(image)
+    lum = highlights(image, clip, blursize, size, detectres, wrap)
+    coarse = label(threshold_mask(lum, threshold), wrap=wrap)
+    return refine(image, coarse, clip, blursize, size, threshold, wrap)
+
+# biggest detect map scrubbed with max-tree, above it regions from the tree take
+# as long as labeling the map again and building the tree isn't paid back
+TREE_PIXELS = 1024 * 512
+
+"""
+Detection with cached stages
+Every stage keeps its result with parameters it depends on, so changing
+a parameter recomputes only stages after it. Changing threshold only
+thresholds cached luminance, changing size starts from blurred map and so on.
+Regions for changing threshold come from max-tree of cached luminance,
+maps bigger than TREE_PIXELS are labeled again.
+Clipped map is not kept in native resolution, clip recomputes from the input.
+"""
+class Detector :
+    def __init__(self, image=None, wrap=True) :
+        self.image = None
+        self.wrap = wrap
+        self.cache = {}
+        if image is not None :
+            self.setImage(image)
+
+    def setImage(self, image) :
+        self.image = as_rgb(image)
+        self.cache.clear()
+
+    # cached result of func for stage name, recomputed when key differs
+    def _stage(self, name, key, func, *args) :
+        cached = self.cache.get(name)
+        if cached is not None and cached[0] == key :
+            return cached[1]
+        value = func(*args)
+        self.cache[name] = (key, value)
+        return value
+
+    def resampled(self, clip, detectres) :
+        key = (clip, detectres)
+        def run() :
+            width, height = detect_res(detectres)
+            return resample(clip_highlights(self.image, clip), width, height)
+        return self._stage("resampled", key, run)
+
+    def blurred(self, clip, blursize, detectres) :
+        key = (clip, detectres, blursize)
+        return self._stage("blurred", key, lambda : blur(self.resampled(clip, detectres), blursize, self.wrap))
+
+    def highlights(self, clip, blursize, size, detectres) :
+        key = (clip, detectres, blursize, size)
+        return self._stage("highlights", key,
+                           lambda : luminance(dilate_erode(self.blurred(clip, blursize, detectres), size, self.wrap)))
+
+    # glue_degrees replaces dilate/erode by size with distance transform glue
+    def mask(self, clip, blursize, size, threshold, detectres, glue_degrees=None) :
+        key = (clip, detectres, blursize, size, threshold, glue_degrees)
+        def run() :
+            if glue_degrees is None :
+                return threshold_mask(self.highlights(clip, blursize, size, detectres), threshold)
+            mask = threshold_mask(self.highlights(clip, blursize, 0, detectres), threshold)
+            return glue(mask, glue_radius(glue_degrees, detectres), self.wrap)
+        return self._stage("mask", key, run)
+
+    def tree(self, clip, blursize, size, detectres) :
+        key = (clip, detectres, blursize, size)
+        return self._stage("tree", key, lambda : MaxTree(self.highlights(clip, blursize, size, detectres), wrap=self.wrap))
+
+    # second threshold on the same highlights builds max-tree, next ones are taken from it
+    def regions(self, clip, blursize, size, threshold, detectres, glue_degrees=None) :
+        key = (clip, detectres, blursize, size, threshold, glue_degrees)
+        def run() :
+            cached = self.cache.get("regions")
+            tree = self.cache.get("tree")
+            scrub = (cached is not None and cached[0][:4] == key[:4]) or (tree is not None and tree[0] == key[:4])
+            width, height = detect_res(detectres)
+            if scrub and threshold >= 0 and glue_degrees is None and width * height <= TREE_PIXELS :
+                return self.tree(clip, blursize, size, detectres).regions(threshold)
+            return label(self.mask(clip, blursize, size, threshold, detectres, glue_degrees), wrap=self.wrap)
+        return self._stage("regions", key, run)
+
+    # glued shapes are outlined by pixel edges, luminance doesn't match them
+    def contours(self, clip, blursize, size, threshold, detectres, glue_degrees=None) :
+        key = (clip, detectres, blursize, size, threshold, glue_degrees)
+        def run() :
+            regions = self.regions(clip, blursize, size, threshold, detectres, glue_degrees)
+            if glue_degrees is not None :
+                return contours(regions)
+            return contours(regions, self.highlights(clip, blursize, size, detectres), threshold)
+        return self._stage("contours", key, run)
+
+    def detect(self, clip=1.0, blursize=3.0, size=2, threshold=0.5, detectres=512, glue_degrees=None) :
+        return self.mask(clip, blursize, size, threshold, detectres, glue_degrees)
+
+"""
+Max-tree (component tree) of highlights luminance
+Built once over pixels brighter than floor, then regions for any threshold
+above floor are taken from the tree without scanning and labeling the map again.
+Every pixel climbs to its brightest neighbour processed before it, which splits the map
+into basins of local maxima. Pixels of a basin above any threshold are connected to its peak,
+so regions at a threshold are basins joined by saddles (brightest edges between them) above it.
+The build is vectorized, only the small graph of basins runs union-find for every threshold.
+"""
+class MaxTree :
+    def __init__(self, lum, floor=0.0, connectivity=8, wrap=True) :
+        lum = numpy.asarray(lum)
+        self.shape = lum.shape
+        self.floor = floor
+        self.connectivity = connectivity
+        self.wrap = wrap
+        height, width = lum.shape
+        flat = lum.reshape(-1)
+        selected = numpy.nonzero(flat > floor)[0]
+        order = numpy.argsort(-flat[selected])
+        self.pixels = selected[order]
+        self.level = flat[self.pixels]
+        count = len(self.pixels)
+
+        # rank of every pixel in processing order, neighbours are views of the padded rank image
+        # with the sides joined when wrapped, pixels at or below floor and outside are never earlier
+        rank = numpy.full(flat.shape, count, dtype=numpy.int64)
+        rank[self.pixels] = numpy.arange(count)
+        rank = rank.reshape(height, width)
+        offsets = ((-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1))
+        if connectivity != 8 :
+            offsets = ((-1, 0), (0, -1), (0, 1), (1, 0))
+        def padded(image, fill) :
+            result = numpy.pad(image, 1, mode="constant", constant_values=fill)
+            if wrap :
+                result[1:-1, 0] = image[:, -1]
+                result[1:-1, -1] = image[:, 0]
+            return result
+        def neighbour(image, dy, dx) :
+            return image[1 + dy:1 + dy + height, 1 + dx:1 + dx + width]
+
+        # every node climbs to its brightest earlier neighbour, then jumps to the peak
+        ranks = padded(rank, count)
+        climb = rank
+        for dy, dx in offsets :
+            climb = numpy.minimum(climb, neighbour(ranks, dy, dx))
+        climb = climb.reshape(-1)[self.pixels]
+        while True :
+            jump = climb[climb]
+            if numpy.array_equal(jump, climb) :
+                break
+            climb = jump
+        peaks = numpy.nonzero(climb == numpy.arange(count))[0]
+        number = numpy.zeros(count, dtype=numpy.int64)
+        number[peaks] = numpy.arange(len(peaks))
+        # basins are numbered from the brightest peak, basins above a threshold come first
+        self.basin = number[climb]
+        self.peak = self.level[peaks]
+
+        # edges between basins, every edge is taken once from the forward half of offsets
+        # and is as bright as its darker (later) node
+        basin = numpy.full(flat.shape, -1, dtype=numpy.int64)
+        basin[self.pixels] = self.basin
+        basin = basin.reshape(height, width)
+        basins = padded(basin, -1)
+        nodes = []
+        first = []
+        second = []
+        for dy, dx in offsets[len(offsets) // 2:] :
+            other = neighbour(basins, dy, dx)
+            cross = (other != basin) & (other >= 0) & (basin >= 0)
+            nodes.append(numpy.maximum(rank[cross], neighbour(ranks, dy, dx)[cross]))
+            first.append(basin[cross])
+            second.append(other[cross])
+        nodes = numpy.concatenate(nodes)
+        low = numpy.minimum(numpy.concatenate(first), numpy.concatenate(second))
+        high = numpy.maximum(numpy.concatenate(first), numpy.concatenate(second))
+
+        # saddle of every pair of basins is its brightest edge, saddles are sorted from bright to dark
+        # one integer key when pairs times nodes fit in int64
+        pair = low * max(len(peaks), 1) + high
+        if len(peaks) ** 2 * max(count, 1) < 2 ** 62 :
+            sort = numpy.argsort(pair * count + nodes)
+        else :
+            sort = numpy.lexsort((nodes, pair))
+        keep = numpy.ones(len(sort), dtype=bool)
+        keep[1:] = pair[sort][1:] != pair[sort][:-1]
+        sort = sort[keep]
+        sort = sort[numpy.argsort(nodes[sort], kind="stable")]
+        self.saddle = self.level[nodes[sort]]
+        self.joins = (low[sort], high[sort])
+
+    # root basin of every basin above threshold
+    def _roots(self, threshold) :
+        basins = int(numpy.count_nonzero(self.peak > threshold))
+        joins = int(numpy.count_nonzero(self.saddle > threshold))
+        return _union_find(basins, self.joins[0][:joins], self.joins[1][:joins])
+
+    # number of regions at threshold
+    def count(self, threshold) :
+        return len(numpy.unique(self._roots(threshold)))
+
+    # Regions of pixels brighter than threshold, same as label(lum > threshold)
+    def regions(self, threshold) :
+        height, width = self.shape
+        count = int(numpy.count_nonzero(self.level > threshold))
+        ids, region = numpy.unique(self._roots(threshold), return_inverse=True)
+        labels = numpy.zeros(height * width, dtype=numpy.int32)
+        labels[self.pixels[:count]] = region.reshape(-1)[self.basin[:count]] + 1
+        labels = labels.reshape(height, width)
+
+        # number regions in raster order like label()
+        rows, starts, ends = _runs(labels > 0)
+        run_labels = labels[rows, starts] - 1
+        first = numpy.full(len(ids), len(rows), dtype=numpy.int64)
+        numpy.minimum.at(first, run_labels, numpy.arange(len(rows)))
+        number = numpy.zeros(len(ids) + 1, dtype=numpy.int32)
+        number[numpy.argsort(first, kind="stable") + 1] = numpy.arange(1, len(ids) + 1)
+        labels = number[labels]
+        run_labels = number[run_labels + 1] - 1
+
+        wrapped = numpy.zeros(len(ids), dtype=bool)
+        if self.wrap and len(ids) :
+            for shift in ((-1, 0, 1) if self.connectivity == 8 else (0,)) :
+                lo, hi = max(0, -shift), min(height, height - shift)
+                a = labels[lo:hi, 0]
+                b = labels[lo + shift:hi + shift, -1]
+                same = (a > 0) & (a == b)
+                wrapped[a[same] - 1] = True
+        sizes, bboxes, centroids = _run_stats(rows, starts, ends, run_labels, len(ids), wrapped, width)
+        return Regions(labels, sizes, bboxes, centroids, wrapped)
+
+"""
+Detection results saved on disk between sessions
+Entries are keyed by the map file (path, modification time and size) and detection
+parameters, so any change of them makes a new entry. Every entry is a compressed npz
+with shape names, polygons, label image and stats of the shapes.
+"""
+class DiskCache :
+    def __init__(self, root, limit=64 * 1024 * 1024) :
+        self.root = root
+        self.limit = limit
+
+    def key(self, path, *parms) :
+        stat = os.stat(path)
+        data = repr((os.path.abspath(path), stat.st_mtime_ns, stat.st_size) + tuple(parms))
+        return hashlib.sha1(data.encode("utf-8")).hexdigest()
+
+    def path(self, key) :
+        return os.path.join(self.root, key + ".npz")
+
+    # names, polygons, labels and stats of entry or None if it isn't saved or can't be read
+    def load(self, key) :
+        path = self.path(key)
+        if not os.path.isfile(path) :
+            return None
+        try :
+            # used entries get new mtime, pruning removes the least recently used ones
+            os.utime(path)
+            with numpy.load(path) as data :
+                offsets = data["offsets"]
+                polygons = [data["points"][offsets[i]:offsets[i + 1]] for i in range(len(offsets) - 1)]
+                stats = Stats(data["energy"], data["color"], data["peak"], data["solid_angle"], data["share"])
+                return data["names"].tolist(), polygons, data["labels"], stats
+        except (OSError, ValueError, KeyError) :
+            return None
+
+    # file is written next to the entry and renamed, so readers never see half written entry
+    def save(self, key, names, polygons, labels, stats) :
+        os.makedirs(self.root, exist_ok=True)
+        polygons = [numpy.asarray(polygon, dtype=numpy.float32).reshape(-1, 2) for polygon in polygons]
+        offsets = numpy.cumsum([0] + [len(polygon) for polygon in polygons])
+        points = numpy.concatenate(polygons) if polygons else numpy.zeros((0, 2), dtype=numpy.float32)
+        temp = self.path(key) + ".tmp"
+        with open(temp, "wb") as file :
+            numpy.savez_compressed(file, names=numpy.array(names, dtype=str), points=points, offsets=offsets,
+                                   labels=labels, energy=stats.energy, color=stats.color, peak=stats.peak,
+                                   solid_angle=stats.solid_angle, share=stats.share)
+        os.replace(temp, self.path(key))
+        self.prune()
+
+    # remove least recently used entries until the folder is under size limit
+    def prune(self) :
+        entries = []
+        for name in os.listdir(self.root) :
+            if name.endswith(".npz") :
+                try :
+                    stat = os.stat(os.path.join(self.root, name))
+                except OSError :
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, name))
+        total = sum(size for mtime, size, name in entries)
+        for mtime, size, name in sorted(entries) :
+            if total <= self.limit :
+                break
+            try :
+                os.remove(os.path.join(self.root, name))
+            except OSError :
+                continue
+            total -= size
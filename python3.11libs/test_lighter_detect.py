@@ -0,0 +1,155 @@
+import time
+import numpy
+import lighter_detect
+
+"""
+Reference tests for lighter_detect
+Fast paths are compared with plain slow implementations on small random maps.
+Run from this folder: python -m pytest test_lighter_detect.py
+"""
+
+# labels by flood fill, longitude is periodic when wrap is set
+def flood_fill(mask, connectivity=8, wrap=True) :
+    height, width = mask.shape
+    labels = numpy.zeros(mask.shape, dtype=numpy.int32)
+    offsets = [(dy, dx) for dy in (-1, 0, 1) for dx in (-1, 0, 1) if (dy, dx) != (0, 0)]
+    if connectivity != 8 :
+        offsets = [(-1, 0), (0, -1), (0, 1), (1, 0)]
+    count = 0
+    for y in range(height) :
+        for x in range(width) :
+            if not mask[y, x] or labels[y, x] :
+                continue
+            count += 1
+            labels[y, x] = count
+            queue = [(y, x)]
+            while queue :
+                cy, cx = queue.pop()
+                for dy, dx in offsets :
+                    ny, nx = cy + dy, cx + dx
+                    if wrap :
+                        nx %= width
+                    if 0 <= ny < height and 0 <= nx < width and mask[ny, nx] and not labels[ny, nx] :
+                        labels[ny, nx] = count
+                        queue.append((ny, nx))
+    return labels, count
+
+# True if both label images split pixels into the same regions
+def same_partition(labels, reference) :
+    if not numpy.array_equal(labels > 0, reference > 0) :
+        return False
+    pairs = numpy.unique(numpy.stack((labels[labels > 0], reference[reference > 0])), axis=1)
+    return len(numpy.unique(pairs[0])) == pairs.shape[1] == len(numpy.unique(pairs[1]))
+
+def random_mask(seed, shape=(24, 48), density=0.45) :
+    return numpy.random.default_rng(seed).random(shape) < density
+
+def test_label_matches_flood_fill() :
+    for seed in range(12) :
+        mask = random_mask(seed)
+        for connectivity in (4, 8) :
+            for wrap in (False, True) :
+                regions = lighter_detect.label(mask, connectivity, wrap)
+                reference, count = flood_fill(mask, connectivity, wrap)
+                assert len(regions) == count
+                assert same_partition(regions.labels, reference)
+                assert regions.sizes.sum() == mask.sum()
+
+def test_label_joins_regions_across_seam() :
+    mask = numpy.zeros((8, 16), dtype=bool)
+    mask[3:5, :2] = True
+    mask[3:5, -2:] = True
+    assert len(lighter_detect.label(mask, wrap=False)) == 2
+    regions = lighter_detect.label(mask, wrap=True)
+    assert len(regions) == 1
+    assert regions.wrapped[0]
+
+def test_max_tree_matches_label() :
+    rng = numpy.random.default_rng(7)
+    lum = lighter_detect.blur(rng.random((32, 64)).astype(numpy.float32) ** 4 * 10.0, 2.0)
+    lum[:, 20:24] = 0.0
+    for connectivity, wrap in ((8, False), (8, True), (4, True)) :
+        tree = lighter_detect.MaxTree(lum, connectivity=connectivity, wrap=wrap)
+        for threshold in numpy.quantile(lum, (0.2, 0.5, 0.8, 0.95)) :
+            regions = tree.regions(threshold)
+            reference = lighter_detect.label(lighter_detect.threshold_mask(lum, threshold), connectivity, wrap)
+            assert tree.count(threshold) == len(reference)
+            assert len(regions) == len(reference)
+            assert same_partition(regions.labels, reference.labels)
+            assert numpy.array_equal(numpy.sort(regions.sizes), numpy.sort(reference.sizes))
+
+# highlights covering the whole detect map, every pixel enters the tree
+def test_max_tree_build_time() :
+    rng = numpy.random.default_rng(11)
+    image = numpy.full((1024, 2048, 3), 1.5, dtype=numpy.float32)
+    image += rng.random(image.shape, dtype=numpy.float32) * 0.5
+    for i in range(300) :
+        y, x = rng.integers(0, 1000), rng.integers(0, 2020)
+        image[y:y+20, x:x+20] = rng.uniform(2.0, 500.0)
+    lum = lighter_detect.highlights(image, 1.0, 3.0, 2, 2048)
+    start = time.perf_counter()
+    tree = lighter_detect.MaxTree(lum)
+    assert time.perf_counter() - start < 3.0
+    reference = lighter_detect.label(lighter_detect.threshold_mask(lum, 0.5))
+    assert same_partition(tree.regions(0.5).labels, reference.labels)
+
+def test_distance_transform_is_exact() :
+    for seed in range(6) :
+        mask = random_mask(seed, (20, 40), 0.03)
+        mask[seed, seed] = True
+        ys, xs = numpy.nonzero(mask)
+        grid_y, grid_x = numpy.mgrid[0:20, 0:40]
+        for wrap in (False, True) :
+            dx = numpy.abs(grid_x[..., None] - xs)
+            if wrap :
+                dx = numpy.minimum(dx, 40 - dx)
+            dy = grid_y[..., None] - ys
+            reference = numpy.sqrt((dx ** 2 + dy ** 2).min(axis=2))
+            result = lighter_detect.distance_transform(mask, wrap)
+            assert numpy.allclose(result, reference, atol=1e-4)
+
+def test_refine_matches_native_detection() :
+    rng = numpy.random.default_rng(3)
+    image = numpy.full((128, 256, 3), 0.2, dtype=numpy.float32)
+    for i in range(10) :
+        y, x = rng.integers(16, 104), rng.integers(16, 232)
+        image[y:y+8, x:x+10] = rng.uniform(20.0, 200.0, 3)
+    clip, blursize, size, threshold = 1.0, 1.5, 1, 0.5
+    refined = lighter_detect.detect_refined(image, clip, blursize, size, threshold, detectres=128, wrap=False)
+
+    # the same chain in native resolution, filters scaled from detect map pixels
+    scale = 256 / 128.0
+    native = lighter_detect.clip_highlights(image, clip)
+    native = lighter_detect.blur(native, blursize * scale, wrap=False)
+    native = lighter_detect.dilate_erode(native, int(round(size * scale)), wrap=False)
+    native = lighter_detect.threshold_mask(lighter_detect.luminance(native), threshold)
+
+    painted = numpy.zeros(native.shape, dtype=bool)
+    for x0, y0, mask in refined.tiles :
+        painted[y0:y0 + mask.shape[0], x0:x0 + mask.shape[1]] |= mask
+    assert numpy.array_equal(painted, native)
+    assert refined.sizes.sum() == native.sum()
+
+def test_auto_params_in_asset_range() :
+    rng = numpy.random.default_rng(5)
+    image = numpy.full((256, 512, 3), 0.3, dtype=numpy.float32)
+    for i in range(40) :
+        y, x = rng.integers(10, 240), rng.integers(0, 505)
+        image[y:y+4, x:x+4] = rng.uniform(50.0, 3000.0)
+    for detectres in (256, 512) :
+        clip, threshold = lighter_detect.auto_params(image, detectres)
+        assert clip >= 1.0
+        assert lighter_detect.THRESHOLD_RANGE[0] <= threshold <= lighter_detect.THRESHOLD_RANGE[1]
+
+# 30 spots of 500 on flat 0.3 background: clip and threshold must fall between the classes, not on the range ends
+def test_auto_params_separate_spots() :
+    image = numpy.full((512, 1024, 3), 0.3, dtype=numpy.float32)
+    centers = [(48 + 80 * (i // 10), 40 + 100 * (i % 10)) for i in range(30)]
+    for y, x in centers :
+        image[y-3:y+3, x-3:x+3] = 500.0
+    clip, threshold = lighter_detect.auto_params(image, 512, wrap=False)
+    assert 1.0 < clip < 500.0
+    assert lighter_detect.THRESHOLD_RANGE[0] < threshold < lighter_detect.THRESHOLD_RANGE[1]
+    regions = lighter_detect.label(lighter_detect.detect(image, clip, threshold=threshold, wrap=False), wrap=False)
+    assert len(regions) == 30
+    assert all(regions.labels[y // 2, x // 2] > 0 for y, x in centers)